@@ -0,0 +1,156 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Понимает методы, которыми пользуется бот (getUpdates, sendMessage, sendPhoto,
+getFile, скачивание файлов и т.д.), отвечает правдоподобными объектами и
+считает вызовы. Сеть и настоящий токен не нужны.
+"""
+import json
+import time
+import socket
+import threading
+import itertools
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeTelegramState:
+    """Что видел сервер: вызовы по методам и очередь апдейтов для getUpdates"""
+
+    def __init__(self, photo_bytes, latency=0.0):
+        self.photo_bytes = photo_bytes
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(1)
+        self.calls = {}
+        self.updates = []
+        self.webhook_url = ''
+
+    def count(self, method):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def push_updates(self, updates):
+        with self.lock:
+            self.updates.extend(updates)
+
+    def take_updates(self, offset, limit=100):
+        with self.lock:
+            if offset:
+                self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            return self.updates[:limit]
+
+
+def _parse_params(handler):
+    length = int(handler.headers.get('content-length') or 0)
+    body = handler.rfile.read(length) if length else b''
+    content_type = handler.headers.get('content-type', '')
+    params = {k: v[0] for k, v in parse_qs(urlparse(handler.path).query).items()}
+    if content_type.startswith('multipart/'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+        for part in message.iter_parts():
+            if part.get_filename():
+                continue
+            content = part.get_content()
+            params[part.get_param('name', header='content-disposition')] = (
+                content if isinstance(content, str) else content.decode())
+    elif body:
+        params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+    return params
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            # Заголовки и тело уходят отдельными записями — без TCP_NODELAY ждём delayed ACK
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, payload, content_type='application/json'):
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._handle()
+
+        def do_POST(self):
+            self._handle()
+
+        def _handle(self):
+            path = urlparse(self.path).path
+            if state.latency:
+                time.sleep(state.latency)
+            if path.startswith('/file/'):
+                state.count('downloadFile')
+                return self._reply(state.photo_bytes, 'image/jpeg')
+
+            method = path.rsplit('/', 1)[-1]
+            params = _parse_params(self)
+            state.count(method)
+            self._reply({'ok': True, 'result': self._result(method, params)})
+
+        def _result(self, method, params):
+            chat_id = int(params.get('chat_id') or 1)
+            message = {
+                'message_id': next(state.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text')
+            }
+            if method == 'getUpdates':
+                updates = state.take_updates(int(params.get('offset') or 0))
+                if not updates:
+                    time.sleep(min(float(params.get('timeout') or 0), 0.2))
+                return updates
+            if method == 'getFile':
+                return {'file_id': params.get('file_id'), 'file_unique_id': 'f',
+                        'file_size': len(state.photo_bytes), 'file_path': 'photos/file_1.jpg'}
+            if method == 'getMe':
+                return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+            if method == 'getWebhookInfo':
+                return {'url': state.webhook_url, 'has_custom_certificate': False, 'pending_update_count': 0}
+            if method == 'setWebhook':
+                state.webhook_url = params.get('url', '')
+                return True
+            if method == 'deleteWebhook':
+                state.webhook_url = ''
+                return True
+            if method in ('answerCallbackQuery', 'setMyCommands'):
+                return True
+            if method == 'sendPhoto':
+                file_id = params.get('photo') or f"photo-{message['message_id']}"
+                message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1, 'height': 1}]
+                message['caption'] = params.get('caption')
+            if method == 'sendDocument':
+                message['document'] = {'file_id': f"doc-{message['message_id']}", 'file_unique_id': 'd'}
+            return message
+
+    return Handler
+
+
+def start_server(photo_bytes, latency=0.0, port=0):
+    """Запустить заглушку в фоновом потоке; вернуть (сервер, состояние)"""
+    state = FakeTelegramState(photo_bytes, latency)
+    server = ThreadingHTTPServer(('127.0.0.1', port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-telegram', daemon=True).start()
+    return server, state
+
+
+def point_telebot_to(server):
+    """Направить запросы telebot на заглушку"""
+    from telebot import apihelper
+    base = f"http://127.0.0.1:{server.server_port}"
+    apihelper.API_URL = base + "/bot{0}/{1}"
+    apihelper.FILE_URL = base + "/file/bot{0}/{1}"
@@ -0,0 +1,322 @@
+"""Нагрузочный тест бота на локальной заглушке Bot API.
+
+Генерирует поток апдейтов (клиенты листают меню, оставляют отзывы, мастер
+загружает фото), прогоняет его через webhook() и/или start_polling и выводит
+апдейты в секунду, p50/p99 времени обработки апдейта и пиковый RSS.
+
+    python bench/run_bench.py --users 300 --mode both
+    python bench/run_bench.py --mode webhook --api-latency 0.02 --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+sys.path.insert(0, BENCH_DIR)
+
+from fake_telegram import start_server, point_telebot_to
+
+TOKEN = '123456:BENCH'
+PASSWORD = 'bench'
+
+CLIENT_BUTTONS = [
+    "💸 Ознакомиться с прайсом",
+    "📅 Свободные места",
+    "✍️ Записаться на ресницы",
+    "🏠 Зайти в главное меню",
+]
+
+
+# ==================== ГЕНЕРАЦИЯ АПДЕЙТОВ ====================
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}"}
+
+def _message(user_id, text=None, photo=False):
+    message = {'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'}, 'from': _user(user_id)}
+    if photo:
+        message['photo'] = [{'file_id': f"in-{user_id}", 'file_unique_id': f"in-{user_id}", 'width': 1280, 'height': 1280}]
+    else:
+        message['text'] = text
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'message': message}
+
+def _callback(user_id, data):
+    return {'callback_query': {
+        'id': f"cb-{user_id}-{data}", 'chat_instance': 'bench', 'data': data, 'from': _user(user_id),
+        'message': {'message_id': 1, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'}, 'text': '-'}
+    }}
+
+def client_session(user_id, rng):
+    """Клиент заходит в бота и листает меню"""
+    steps = [_message(user_id, '/start'), _message(user_id, 'Клиент'), _message(user_id, '🏠 Зайти в главное меню')]
+    steps += [_message(user_id, rng.choice(CLIENT_BUTTONS)) for _ in range(rng.randint(2, 6))]
+    return steps
+
+def review_session(user_id, rng):
+    """Клиент оставляет отзыв"""
+    return client_session(user_id, rng)[:3] + [
+        _message(user_id, '⭐️ Оставить отзыв'),
+        _callback(user_id, f"rating_{rng.randint(1, 5)}"),
+        _message(user_id, f"Отзыв от {user_id}: " + 'очень понравилось ' * rng.randint(1, 20)),
+    ]
+
+def master_session(user_id, rng):
+    """Мастер входит, смотрит отзывы и загружает новое фото свободных мест"""
+    return [
+        _message(user_id, 'Мастер'),
+        _message(user_id, PASSWORD),
+        _message(user_id, '🏠 Зайти в меню мастера'),
+        _message(user_id, '⭐️ Отзывы'),
+        _message(user_id, '📊 Статистика отзывов'),
+        _message(user_id, '📝 Посмотреть все отзывы'),
+        _message(user_id, '✍️ Обновить свободные места'),
+        _message(user_id, photo=True),
+    ]
+
+def build_stream(users, first_user, first_update_id, rng, review_share=0.3, master_share=0.02):
+    """Сессии пользователей, перемешанные так, как они приходят одновременно"""
+    sessions = []
+    for user_id in range(first_user, first_user + users):
+        roll = rng.random()
+        if roll < master_share:
+            sessions.append(master_session(user_id, rng))
+        elif roll < master_share + review_share:
+            sessions.append(review_session(user_id, rng))
+        else:
+            sessions.append(client_session(user_id, rng))
+
+    stream = []
+    update_id = first_update_id
+    while sessions:
+        session = rng.choice(sessions)
+        update = session.pop(0)
+        update['update_id'] = update_id
+        if 'message' in update:
+            update['message']['message_id'] = update_id
+        stream.append(update)
+        update_id += 1
+        if not session:
+            sessions.remove(session)
+    return stream
+
+
+# ==================== ЗАМЕРЫ ====================
+class Tracker:
+    """Считает обработанные апдейты и время обработки каждого, а также
+    фоновые задачи media_pool (скачивание и пережатие фото), которые
+    заканчиваются уже после process_update"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.done = 0
+        self.media_latencies = []
+        self.media_running = 0
+
+    def reset(self):
+        with self.lock:
+            self.latencies = []
+            self.done = 0
+            self.media_latencies = []
+
+    def wrap(self, process):
+        def wrapper(update):
+            start = time.perf_counter()
+            try:
+                process(update)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.latencies.append(elapsed)
+                    self.done += 1
+        return wrapper
+
+    def wrap_submit(self, submit):
+        """Обёртка media_pool.submit: время фоновой задачи от постановки до конца"""
+        def task(queued, fn, *args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.media_latencies.append(time.perf_counter() - queued)
+                    self.media_running -= 1
+
+        def wrapper(fn, *args, **kwargs):
+            with self.lock:
+                self.media_running += 1
+            return submit(task, time.perf_counter(), fn, *args, **kwargs)
+        return wrapper
+
+    def wait(self, total, timeout):
+        """Дождаться всех апдейтов и фоновых задач фото, которые они запустили"""
+        deadline = time.time() + timeout
+        while self.done < total or self.media_running:
+            if time.time() > deadline:
+                raise TimeoutError(f"обработано {self.done} из {total} апдейтов, "
+                                   f"фоновых задач осталось {self.media_running}")
+            time.sleep(0.01)
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+def peak_rss_mb():
+    # На Linux ru_maxrss в килобайтах, на macOS — в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def summarize(mode, tracker, elapsed, server_state):
+    with server_state.lock:
+        calls = dict(server_state.calls)
+        server_state.calls.clear()
+    return {
+        'mode': mode,
+        'updates': tracker.done,
+        'seconds': round(elapsed, 3),
+        'updates_per_second': round(tracker.done / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(tracker.latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(tracker.latencies, 0.99) * 1000, 2),
+        'media_tasks': len(tracker.media_latencies),
+        'media_p50_ms': round(percentile(tracker.media_latencies, 0.50) * 1000, 2),
+        'media_p99_ms': round(percentile(tracker.media_latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'api_calls': calls,
+    }
+
+
+# ==================== РЕЖИМЫ ====================
+def run_webhook(bot_module, tracker, stream, senders, timeout):
+    """Апдейты приходят POST-запросами в webhook() из нескольких потоков"""
+    bot_module.update_dispatcher.start()
+    url = f"/{TOKEN}"
+
+    # Апдейты одного чата отправляет один и тот же поток, чтобы сохранить порядок
+    parts = [[] for _ in range(senders)]
+    for update in stream:
+        chat = update.get('message', update.get('callback_query', {}).get('message'))['chat']['id']
+        parts[chat % senders].append(json.dumps(update))
+
+    def send(part):
+        client = bot_module.app.test_client()
+        for body in part:
+            while client.post(url, data=body, content_type='application/json').status_code == 503:
+                time.sleep(0.005)
+
+    threads = [threading.Thread(target=send, args=(part,)) for part in parts]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracker.wait(len(stream), timeout)
+    return time.perf_counter() - start
+
+def run_polling(bot_module, tracker, stream, server_state, timeout):
+    """Апдейты забирает start_polling через getUpdates"""
+    server_state.push_updates(stream)
+    start = time.perf_counter()
+    threading.Thread(target=bot_module.start_polling, name='bench-polling', daemon=True).start()
+    tracker.wait(len(stream), timeout)
+    return time.perf_counter() - start
+
+
+# ==================== ЗАПУСК ====================
+def prepare_workdir():
+    """Временная папка с фото, в которой бот будет создавать свои файлы"""
+    workdir = tempfile.mkdtemp(prefix='flashbot-bench-')
+    welcome = os.path.join(ROOT_DIR, 'welcome', 'flash.jpg')
+    for folder, name in (('welcome', 'flash.jpg'), ('price_photo', 'price.jpg'), ('records', 'place.jpg')):
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+        shutil.copy(welcome, os.path.join(workdir, folder, name))
+    return workdir
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальной заглушке Bot API")
+    parser.add_argument('--mode', choices=['webhook', 'polling', 'both'], default='both')
+    parser.add_argument('--users', type=int, default=200, help="пользователей в каждом прогоне")
+    parser.add_argument('--workers', type=int, default=8, help="WEBHOOK_WORKERS для бота")
+    parser.add_argument('--senders', type=int, default=4, help="потоков, отправляющих вебхуки")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа заглушки, сек")
+    parser.add_argument('--real-limits', action='store_true', help="не снимать лимиты частоты отправки")
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    workdir = prepare_workdir()
+    os.chdir(workdir)
+    with open(os.path.join(ROOT_DIR, 'welcome', 'flash.jpg'), 'rb') as f:
+        server, server_state = start_server(f.read(), latency=args.api_latency)
+
+    os.environ.update({
+        'TELEGRAM_TOKEN': TOKEN,
+        'MASTER_PASSWORD': PASSWORD,
+        'WEBHOOK_URL': '',
+        'WEBHOOK_WORKERS': str(args.workers),
+        'STATE_SNAPSHOT_INTERVAL': '0',
+        # Сессии генератора идут без пауз: входной фильтр отбросил бы большую часть апдейтов
+        'INBOUND_RATE': '1000000',
+        'INBOUND_BURST': '1000000',
+        'INBOUND_COALESCE_WINDOW': '0',
+    })
+    if not args.real_limits:
+        # Иначе прогон упрётся в лимит 1 сообщение/с на чат, а не в код бота
+        os.environ.update({'API_GLOBAL_RATE': '1000000', 'API_CHAT_RATE': '1000000', 'API_CHAT_BURST': '1000000'})
+
+    sys.path.insert(0, SRC_DIR)
+    import bot as bot_module
+    point_telebot_to(server)
+    # Фоновые службы бенчмарку не нужны, а папки с данными бот создаёт только при запуске
+    bot_module.create_dirs()
+
+    tracker = Tracker()
+    # Замеряем process_update целиком: обработчики и отправку накопленных ответов (outbox)
+    bot_module.update_dispatcher._process = tracker.wrap(bot_module.process_update)
+    # Фото мастера скачиваются и пережимаются в media_pool уже после ответа — считаем отдельно
+    bot_module.media_pool.submit = tracker.wrap_submit(bot_module.media_pool.submit)
+
+    rng = random.Random(args.seed)
+    results = []
+    modes = ['webhook', 'polling'] if args.mode == 'both' else [args.mode]
+    for number, mode in enumerate(modes):
+        stream = build_stream(args.users, 1000 + number * args.users, 1 + number * 1000000, rng)
+        tracker.reset()
+        if mode == 'webhook':
+            elapsed = run_webhook(bot_module, tracker, stream, args.senders, args.timeout)
+        else:
+            elapsed = run_polling(bot_module, tracker, stream, server_state, args.timeout)
+        results.append(summarize(mode, tracker, elapsed, server_state))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            print(f"=== {result['mode']} ===")
+            print(f"апдейтов:       {result['updates']} за {result['seconds']} с")
+            print(f"апдейтов/с:     {result['updates_per_second']}")
+            print(f"p50 / p99:      {result['p50_ms']} / {result['p99_ms']} мс (обработчики и отправка ответов)")
+            print(f"фото в фоне:    {result['media_tasks']} задач, p50 / p99 "
+                  f"{result['media_p50_ms']} / {result['media_p99_ms']} мс (очередь, скачивание, пережатие, отправка)")
+            print(f"пиковый RSS:    {result['peak_rss_mb']} МБ")
+            print(f"вызовы API:     {result['api_calls']}")
+
+    # Папку удаляем, только когда фоновые задачи закончили писать в неё
+    bot_module.media_pool.shutdown(wait=True)
+    shutil.rmtree(workdir, ignore_errors=True)
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
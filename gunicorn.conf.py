@@ -0,0 +1,20 @@
+"""Настройки gunicorn для продакшен-режима: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+import multiprocessing
+
+# Модули бота лежат в src/, а папки с данными — в корне репозитория
+pythonpath = 'src'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# По умолчанию — воркер на ядро, внутри каждого несколько потоков
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = 60
+graceful_timeout = 30
+
+# Воркеры делят отзывы, диалоги, окна, подписчиков и напоминания только через общую базу;
+# через неё же держится порядок апдейтов одного чата и отсев повторных доставок
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+# Лимит отправки API_GLOBAL_RATE — на весь бот: каждый воркер берёт свою долю
+os.environ.setdefault('WORKER_PROCESSES', str(workers))
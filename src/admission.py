@@ -0,0 +1,85 @@
+import time
+import threading
+from collections import OrderedDict
+
+from rate_limit import TokenBucket
+
+
+def update_user(update):
+    """Кто прислал апдейт: id пользователя или None"""
+    for source in (update.message, update.edited_message, update.callback_query):
+        if source is not None and source.from_user is not None:
+            return source.from_user.id
+    return None
+
+
+def update_signature(update):
+    """Что именно нажато или отправлено — для склейки повторов"""
+    if update.callback_query is not None:
+        return 'callback', update.callback_query.data
+    message = update.message or update.edited_message
+    if message is not None and message.text is not None:
+        return 'text', message.text
+    # Фото и прочие вложения не склеиваем: они всегда разные
+    return None
+
+
+class AdmissionControl:
+    """Входной фильтр апдейтов перед обработчиками.
+
+    У каждого пользователя своя корзина токенов (rate в секунду, запас burst):
+    апдейты сверх неё отбрасываются, не доходя до обработчиков. Одинаковые
+    нажатия одного пользователя чаще раза в coalesce_window секунд
+    склеиваются в одно, кроме чатов, где expects_input(update) — бот ждёт
+    ответа шагом диалога и повтор может быть именно этим ответом. Корзины
+    давно молчащих пользователей вытесняются. on_drop(reason, update)
+    вызывается для каждого отброшенного апдейта.
+    """
+
+    def __init__(self, rate=1.0, burst=5, coalesce_window=1.0, max_users=10000, on_drop=None, expects_input=None):
+        self.rate = rate
+        self.burst = burst
+        self.coalesce_window = coalesce_window
+        self.max_users = max_users
+        self.on_drop = on_drop
+        self.expects_input = expects_input
+        self._lock = threading.Lock()
+        self._users = OrderedDict()   # user_id -> [TokenBucket, последняя подпись, её время]
+
+    def _drop(self, reason, update):
+        if self.on_drop is not None:
+            self.on_drop(reason, update)
+        return False
+
+    def _coalescable(self, update):
+        return self.expects_input is None or not self.expects_input(update)
+
+    def admit(self, update):
+        """True — апдейт можно обрабатывать"""
+        user_id = update_user(update)
+        if user_id is None:
+            return True
+        signature = update_signature(update)
+        if signature is not None and not self._coalescable(update):
+            signature = None
+        now = time.monotonic()
+        reason = None
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = self._users[user_id] = [TokenBucket(self.rate, self.burst), None, 0.0]
+                if len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+
+            if signature is not None and signature == entry[1] and now - entry[2] < self.coalesce_window:
+                reason = 'coalesced'
+            elif not entry[0].try_take(now):
+                reason = 'throttled'
+            else:
+                entry[1], entry[2] = signature, now
+        # on_drop может обращаться к Bot API — не под блокировкой
+        if reason is not None:
+            return self._drop(reason, update)
+        return True
@@ -0,0 +1,139 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Lazy:
+    """Объект, который создаётся при первом обращении.
+
+    Атрибуты, len(), итерация, in, обращение по ключу и проверка на
+    истинность передаются созданному объекту, поэтому код, использующий
+    его, не меняется.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+
+    def resolve(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __bool__(self):
+        return bool(self.resolve())
+
+    def __contains__(self, item):
+        return item in self.resolve()
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __setitem__(self, key, value):
+        self.resolve()[key] = value
+
+    def __delitem__(self, key):
+        del self.resolve()[key]
+
+
+class BootSequence:
+    """Фазы запуска с замером времени и признак готовности к трафику"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}   # фаза -> длительность в секундах
+        self._ready = threading.Event()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = elapsed
+            print(f"⏱ {name}: {elapsed * 1000:.0f} мс")
+
+    def record(self, name, since):
+        """Записать фазу, начавшуюся в момент since (perf_counter)"""
+        elapsed = time.perf_counter() - since
+        self.phases[name] = elapsed
+        print(f"⏱ {name}: {elapsed * 1000:.0f} мс")
+
+    def warm_up(self, steps):
+        """Выполнить шаги прогрева в фоне, затем отметить готовность.
+
+        Ошибка одного шага не мешает остальным: всё, что не прогрелось,
+        загрузится при первом обращении.
+        """
+        def run():
+            for name, step in steps:
+                try:
+                    with self.phase(name):
+                        step()
+                except Exception as e:
+                    print(f"⚠️ Прогрев «{name}» не удался: {e}")
+            self.mark_ready()
+
+        thread = threading.Thread(target=run, name='warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def mark_ready(self):
+        if not self._ready.is_set():
+            self._ready.set()
+            print(f"✅ Бот готов за {time.perf_counter() - self.started:.2f} с с начала запуска")
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'uptime': round(time.perf_counter() - self.started, 3),
+            'phases_ms': {name: round(elapsed * 1000, 1) for name, elapsed in self.phases.items()}
+        }
+
+
+_leader_lock = None
+
+def acquire_leadership(lock_file):
+    """Стать ведущим процессом среди воркеров WSGI (неблокирующий flock).
+
+    Ведущий выполняет фоновые задачи, которые должны идти в одном экземпляре:
+    снимки отзывов, досылку рассылки. Блокировка снимается вместе с процессом,
+    и её подхватывает следующий запущенный воркер.
+    """
+    global _leader_lock
+    if _leader_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # Нет flock (Windows) — там и несколько воркеров gunicorn не запустить
+        return True
+    handle = open(lock_file, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _leader_lock = handle
+    return True
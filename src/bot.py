@@ -2,10 +2,45 @@ import os
 import telebot 
 from telebot.types import ReplyKeyboardRemove
 from telebot import types
+from telebot import apihelper
 import time
-from flask import Flask, request 
+from flask import Flask, request, send_from_directory
 import json
-from datetime import datetime
+import html
+import functools
+import tempfile
+import hmac
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from media_cache import MediaCache
+from review_store import ReviewStore
+from review_snapshots import ReviewSnapshots
+from review_search import parse_query, near_duplicate
+from review_export import write_export, export_file_name
+from update_dispatcher import UpdateDispatcher
+from long_polling import LongPoller
+from admission import AdmissionControl
+from routing import TextRouter
+from state_store import StateStore, StateHandlerBackend
+from rate_limit import SendScheduler
+from outbox import Outbox
+from http_client import build_session
+from media_ingest import ingest_photo
+from broadcast import SubscriberRegistry, Broadcaster
+from slot_store import SlotStore, week_start
+from reminders import ReminderScheduler
+from metrics import Registry, timed
+from profiling import SlowUpdateLog, SamplingProfiler, traced, note_api
+from boot import BootSequence, Lazy, acquire_leadership
+from sqlite_backend import (
+    Database, SqliteReviewStore, SqliteStateStore, SqliteMediaCache,
+    SqliteSlotStore, SqliteSubscriberRegistry, SqliteReminderScheduler, SqliteUpdateClaims
+)
+
+# Замер фаз запуска и готовность к трафику (см. /health)
+boot = BootSequence()
 
 # ==================== КОНФИГУРАЦИЯ ПЕРЕМЕННЫХ RAILWAY ====================
 # Получаем переменные из окружения Railway с fallback значениями
@@ -18,6 +53,78 @@ PORT = int(os.environ.get('PORT', 5000))
 WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
 RAILWAY_ENVIRONMENT = os.environ.get('RAILWAY_ENVIRONMENT', 'production')
 
+# Обработка вебхуков: число потоков и максимальная длина очереди
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 1000))
+# Long polling (без WEBHOOK_URL): ожидание на стороне Telegram (сек), апдейтов за запрос, максимальная пауза после ошибок (сек)
+POLLING_TIMEOUT = int(os.environ.get('POLLING_TIMEOUT', 25))
+POLLING_LIMIT = int(os.environ.get('POLLING_LIMIT', 100))
+POLLING_BACKOFF_MAX = float(os.environ.get('POLLING_BACKOFF_MAX', 60))
+
+# Состояние диалогов: максимум записей, срок жизни (сек) и период снимков на диск (0 — без снимков)
+STATE_MAX_ENTRIES = int(os.environ.get('STATE_MAX_ENTRIES', 10000))
+STATE_TTL = int(os.environ.get('STATE_TTL', 3600))
+STATE_SNAPSHOT_INTERVAL = int(os.environ.get('STATE_SNAPSHOT_INTERVAL', 60))
+
+# Хранилище: files — файлы одного процесса, sqlite — общая база для нескольких воркеров gunicorn
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'files')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join("state", "bot.db"))
+
+# Входящий поток от одного пользователя: апдейтов в секунду, запас, окно склейки одинаковых нажатий (сек)
+INBOUND_RATE = float(os.environ.get('INBOUND_RATE', 1))
+INBOUND_BURST = int(os.environ.get('INBOUND_BURST', 5))
+INBOUND_COALESCE_WINDOW = float(os.environ.get('INBOUND_COALESCE_WINDOW', 1.0))
+# Почти такой же отзыв от того же пользователя в пределах окна (часы) повторно не сохраняется
+REVIEW_DEDUP_HOURS = float(os.environ.get('REVIEW_DEDUP_HOURS', 24))
+REVIEW_DEDUP_SIMILARITY = float(os.environ.get('REVIEW_DEDUP_SIMILARITY', 0.9))
+
+# Лимиты Telegram на отправку: сообщений в секунду всего и в один чат
+API_GLOBAL_RATE = float(os.environ.get('API_GLOBAL_RATE', 30))
+# Сколько процессов делят API_GLOBAL_RATE (gunicorn.conf.py подставляет число воркеров)
+WORKER_PROCESSES = max(int(os.environ.get('WORKER_PROCESSES', 1)), 1)
+API_CHAT_RATE = float(os.environ.get('API_CHAT_RATE', 1))
+API_CHAT_BURST = int(os.environ.get('API_CHAT_BURST', 3))
+API_MAX_RETRIES = int(os.environ.get('API_MAX_RETRIES', 3))
+
+# HTTP-соединения с Bot API: размер пула, keep-alive и таймауты (сек)
+TELEGRAM_POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', 16))
+TELEGRAM_KEEPALIVE = int(os.environ.get('TELEGRAM_KEEPALIVE', 60))
+TELEGRAM_CONNECT_TIMEOUT = float(os.environ.get('TELEGRAM_CONNECT_TIMEOUT', 5))
+TELEGRAM_READ_TIMEOUT = float(os.environ.get('TELEGRAM_READ_TIMEOUT', 30))
+# Сколько загрузок и скачиваний фото может идти одновременно
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 4))
+# Фото от мастера пережимаются: максимальная сторона в пикселях и качество JPEG
+PHOTO_MAX_SIDE = int(os.environ.get('PHOTO_MAX_SIDE', 1280))
+PHOTO_QUALITY = int(os.environ.get('PHOTO_QUALITY', 85))
+# Рассылка свободных мест подписчикам: сколько отправок держать в полёте
+BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', 8))
+# Длительность окна для записи, если мастер её не указал (минуты)
+SLOT_DEFAULT_DURATION = int(os.environ.get('SLOT_DEFAULT_DURATION', 120))
+# Напоминания о записи: за сколько часов до визита (через запятую) и сколько отправок держать в полёте
+REMINDER_OFFSETS_HOURS = [float(hours) for hours in os.environ.get('REMINDER_OFFSETS_HOURS', '24,2').split(',') if hours.strip()]
+REMINDER_WORKERS = int(os.environ.get('REMINDER_WORKERS', 4))
+
+# Как часто журнал отзывов сбрасывается на диск (секунды)
+REVIEWS_FLUSH_INTERVAL = float(os.environ.get('REVIEWS_FLUSH_INTERVAL', 1.0))
+# Сколько отзывов показывать на одной странице
+REVIEWS_PAGE_SIZE = int(os.environ.get('REVIEWS_PAGE_SIZE', 5))
+# Резервные копии отзывов: период снимков (часы), срок хранения (дни), каждый N-й снимок — полный
+BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', 6))
+BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
+BACKUP_FULL_EVERY = int(os.environ.get('BACKUP_FULL_EVERY', 24))
+
+# Диагностика: апдейты дольше SLOW_UPDATE_MS попадают в журнал медленных (0 — выключено);
+# профилирование — PROFILE_SECONDS после запуска или POST /debug/profile с PROFILE_TOKEN
+SLOW_UPDATE_MS = float(os.environ.get('SLOW_UPDATE_MS', 1000))
+PROFILE_SECONDS = float(os.environ.get('PROFILE_SECONDS', 0))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 300))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+# Текст сообщения, которое отправляется только ради клавиатуры меню
+MENU_PROMPT = "Выберите действие"
+
 
 # ==================== ПРОВЕРКА ПЕРЕМЕННЫХ ====================
 def validate_environment_variables():
@@ -37,26 +144,260 @@ def validate_environment_variables():
     print("✅ Все обязательные переменные настроены")
     return True
 
+# ==================== МЕТРИКИ ====================
+metrics_registry = Registry()
+HANDLER_LATENCY = metrics_registry.histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика', ['handler'])
+HANDLER_ERRORS = metrics_registry.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ['handler'])
+API_LATENCY = metrics_registry.histogram(
+    'telegram_api_request_duration_seconds', 'Время запроса к Bot API', ['method'])
+API_ERRORS = metrics_registry.counter(
+    'telegram_api_errors_total', 'Ошибки запросов к Bot API', ['method', 'code'])
+
+UPDATES_DROPPED = metrics_registry.counter(
+    'bot_updates_dropped_total', 'Апдейты, отброшенные входным фильтром', ['reason'])
+
+# Замер обработчика: количество вызовов, задержка и ошибки
+timed_handler = timed(HANDLER_LATENCY, HANDLER_ERRORS)
+
+def track_handler(func):
+    """Метрики обработчика и его имя в трассировке медленных апдейтов"""
+    return timed_handler(traced(func))
+
+
 # ==================== ИНИЦИАЛИЗАЦИЯ БОТА ====================
-bot = telebot.TeleBot(token=TOKEN, threaded=True)
+# Хранилища ниже открываются в Lazy: файлы и база читаются в фазе «хранилища»
+# (start_services) или при первом обращении, а не при импорте модуля
+STATE_DIR = "state"
+
+# Общая база SQLite (WAL): отзывы, диалоги и file_id видны всем воркерам
+database = Lazy(lambda: Database(SQLITE_PATH)) if STORAGE_BACKEND == 'sqlite' else None
+
+# Незавершённые диалоги: выбранная оценка и next-step обработчики telebot
+if database is not None:
+    user_data = SqliteStateStore(database, 'user_data', STATE_MAX_ENTRIES, STATE_TTL)
+    next_steps = SqliteStateStore(database, 'next_steps', STATE_MAX_ENTRIES, STATE_TTL)
+else:
+    user_data = Lazy(lambda: StateStore(STATE_MAX_ENTRIES, STATE_TTL, os.path.join(STATE_DIR, "user_data.pickle")))
+    next_steps = Lazy(lambda: StateStore(STATE_MAX_ENTRIES, STATE_TTL, os.path.join(STATE_DIR, "next_steps.pickle")))
+
+class LoggingExceptionHandler(telebot.ExceptionHandler):
+    """Ошибка в обработчике не должна останавливать обработку остальных апдейтов"""
+    def handle(self, exception):
+        print(f"❌ Ошибка в обработчике: {exception}")
+        return True
+
+# Одна сессия с пулом keep-alive соединений на все запросы к Bot API
+http_session = build_session(pool_size=TELEGRAM_POOL_SIZE, keepalive=TELEGRAM_KEEPALIVE)
+apihelper.session = http_session
+apihelper.SESSION_TIME_TO_LIVE = None
+apihelper.CONNECT_TIMEOUT = TELEGRAM_CONNECT_TIMEOUT
+apihelper.READ_TIMEOUT = TELEGRAM_READ_TIMEOUT
+
+def timed_api_request(method, url, **kwargs):
+    """Запрос к Bot API с замером задержки и учётом ошибок по методу"""
+    api_method = url.rsplit('/', 1)[-1]
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        response = http_session.request(method, url, **kwargs)
+    except Exception:
+        API_ERRORS.inc(api_method, 'network')
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        API_LATENCY.observe(elapsed, api_method)
+        note_api(elapsed, time.thread_time() - cpu_start)
+    if response.status_code >= 400:
+        API_ERRORS.inc(api_method, str(response.status_code))
+    return response
+
+# Все запросы к Bot API проходят через общий ограничитель частоты;
+# ограничитель у каждого процесса свой, поэтому общий лимит делится между воркерами
+send_scheduler = SendScheduler(
+    timed_api_request,
+    global_rate=API_GLOBAL_RATE / WORKER_PROCESSES,
+    chat_rate=API_CHAT_RATE,
+    chat_burst=API_CHAT_BURST,
+    max_retries=API_MAX_RETRIES
+)
+# Сообщения одного апдейта копятся в буфере: соседние тексты склеиваются,
+# клавиатура меню прикрепляется к последнему сообщению вместо отдельного «Выберите действие»
+outbox = Outbox(send_scheduler.request, filler_texts=(MENU_PROMPT,))
+apihelper.CUSTOM_REQUEST_SENDER = outbox.request
+
+# Параллельность обеспечивает UpdateDispatcher, поэтому сам telebot работает без потоков
+bot = telebot.TeleBot(
+    token=TOKEN,
+    threaded=False,
+    exception_handler=LoggingExceptionHandler(),
+    next_step_backend=StateHandlerBackend(next_steps)
+)
 app = Flask(__name__)
 
+# Пользователь, который засыпает бота нажатиями, не занимает общие потоки
+def update_dropped(reason, update):
+    UPDATES_DROPPED.inc(reason)
+    # Без ответа кнопка у пользователя крутится, пока Telegram не сдастся
+    if update.callback_query is not None:
+        try:
+            bot.answer_callback_query(update.callback_query.id)
+        except Exception as e:
+            print(f"⚠️ Не удалось ответить на отброшенное нажатие: {e}")
 
-PRICE_DIR = "price_photo"
-os.makedirs(PRICE_DIR, exist_ok=True)
+def expects_input(update):
+    """Чат в середине диалога: следующее сообщение ждёт next-step обработчик"""
+    return update.message is not None and update.message.chat.id in next_steps
+
+admission = AdmissionControl(
+    rate=INBOUND_RATE,
+    burst=INBOUND_BURST,
+    coalesce_window=INBOUND_COALESCE_WINDOW,
+    on_drop=update_dropped,
+    expects_input=expects_input
+)
+
+# Журнал медленных апдейтов и профилировщик смотрят только на потоки, занятые апдейтом
+PROFILE_DIR = "profiles"
+slow_updates = SlowUpdateLog(
+    os.path.join(PROFILE_DIR, "slow_updates.jsonl"),
+    SLOW_UPDATE_MS / 1000,
+    # Тексты кнопок и команды сохраняются как есть, остальной текст скрывается
+    keep_text=lambda text: text in text_router or text.startswith('/'),
+    # Ключ из PROFILE_TOKEN: хэши одного чата совпадают во всех воркерах и после перезапуска
+    id_key=hmac.new(PROFILE_TOKEN.encode(), b'slow-update-ids', hashlib.sha256).digest() if PROFILE_TOKEN else None
+)
+profiler = SamplingProfiler(PROFILE_DIR)
+
+def process_update(update):
+    """Обработать апдейт; последний ответ уходит после обработчика"""
+    try:
+        with slow_updates.trace(update), outbox.collect():
+            bot.process_new_updates([update])
+    except Exception as e:
+        # Задержанное сообщение не ушло после выхода из обработчика
+        HANDLER_ERRORS.inc('outbox')
+        bot.exception_handler.handle(e)
+
+# Под gunicorn апдейты одного чата приходят в разные воркеры: порядок и дубли — через общую базу
+update_dispatcher = UpdateDispatcher(
+    process_update,
+    workers=WEBHOOK_WORKERS,
+    queue_size=WEBHOOK_QUEUE_SIZE,
+    admit=admission.admit,
+    claims=SqliteUpdateClaims(database) if database is not None else None
+)
+
+# Бот обрабатывает только сообщения и нажатия кнопок, остальные апдейты Telegram не присылает
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+def fetch_updates(offset, limit, timeout, allowed_updates):
+    return bot.get_updates(
+        offset=offset,
+        limit=limit,
+        timeout=TELEGRAM_CONNECT_TIMEOUT,
+        allowed_updates=allowed_updates,
+        long_polling_timeout=timeout
+    )
 
+# Режим polling: смещение переживает перезапуск, пачки идут в тот же UpdateDispatcher
+poller = Lazy(lambda: LongPoller(
+    fetch_updates,
+    update_dispatcher.submit,
+    os.path.join(STATE_DIR, "polling_offset.json"),
+    allowed_updates=ALLOWED_UPDATES,
+    timeout=POLLING_TIMEOUT,
+    limit=POLLING_LIMIT,
+    backoff_max=POLLING_BACKOFF_MAX
+))
+
+# Скачивание фото идёт в отдельном пуле и не занимает потоки обработки апдейтов
+media_pool = ThreadPoolExecutor(max_workers=MEDIA_WORKERS, thread_name_prefix='media')
+
+def media_task(handler):
+    """Выполнять обработчик в пуле передачи файлов"""
+    @functools.wraps(handler)
+    def wrapper(message):
+        media_pool.submit(_run_media_task, handler, message)
+    return wrapper
+
+def _run_media_task(handler, message):
+    start = time.perf_counter()
+    try:
+        with slow_updates.trace(message, kind=f"{handler.__name__}_media"), outbox.collect():
+            handler(message)
+    except Exception as e:
+        HANDLER_ERRORS.inc(f"{handler.__name__}_media")
+        print(f"❌ Ошибка передачи файла в {handler.__name__}: {e}")
+    finally:
+        HANDLER_LATENCY.observe(time.perf_counter() - start, f"{handler.__name__}_media")
+
+# Кнопки меню разбираются поиском по словарю, а не перебором предикатов
+text_router = TextRouter()
+text_router.attach(bot)
+
+
+# ==================== КЛАВИАТУРЫ ====================
+def build_keyboard(*rows):
+    """Собирает клавиатуру один раз при запуске и сразу сериализует её в JSON"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    for row in rows:
+        markup.row(*(types.KeyboardButton(text) for text in row))
+    return markup.to_json()
+
+ROLE_KEYBOARD = build_keyboard(["Клиент", "Мастер"])
+MASTER_ENTER_KEYBOARD = build_keyboard(["🏠 Зайти в меню мастера"])
+MASTER_MENU_KEYBOARD = build_keyboard(
+    ["💸 Установить прайс"],
+    ["✍️ Обновить свободные места", "🗓 Окна для записи"],
+    ["📅 Посмотреть текущие свободные места и прайс"],
+    ["⭐️ Отзывы"]
+)
+MASTER_EXIT_KEYBOARD = build_keyboard(["🏠 Выйти в меню мастера"])
+MASTER_REVIEWS_KEYBOARD = build_keyboard(
+    ["📊 Статистика отзывов", "📝 Посмотреть все отзывы"],
+    ["🔎 Поиск отзывов", "🗂 Резервные копии"],
+    ["📤 Экспорт отзывов", "🗑️ Удалить все отзывы"],
+    ["🏠 Выйти в меню мастера"]
+)
+CONFIRM_DELETE_KEYBOARD = build_keyboard(["✅ Да, удалить все", "❌ Нет, отменить"])
+CLIENT_ENTER_KEYBOARD = build_keyboard(["🏠 Зайти в главное меню"])
+CLIENT_MENU_KEYBOARD = build_keyboard(
+    ["💸 Ознакомиться с прайсом"],
+    ["📅 Свободные места"],
+    ["✍️ Записаться на ресницы"],
+    ["⭐️ Оставить отзыв"],
+    ["🔔 Уведомления о местах"]
+)
+CANCEL_KEYBOARD = build_keyboard(["🏠 Отмена"])
+REMOVE_KEYBOARD = ReplyKeyboardRemove().to_json()
+
+_rating_markup = types.InlineKeyboardMarkup(row_width=5)
+_rating_markup.add(*(types.InlineKeyboardButton("⭐" * i, callback_data=f"rating_{i}") for i in range(1, 6)))
+RATING_KEYBOARD = _rating_markup.to_json()
+
+
+PRICE_DIR = "price_photo"
 REVIEWS_DIR = "reviews"
-os.makedirs(REVIEWS_DIR, exist_ok=True)
 FLASH_DIR = "welcome"
-os.makedirs(FLASH_DIR, exist_ok=True)
-
 RECORDS_DIR = "records"
-os.makedirs(RECORDS_DIR, exist_ok=True)
 
 REVIEWS_FILE = os.path.join(REVIEWS_DIR, "reviews.json")
+REVIEWS_LOG_FILE = os.path.join(REVIEWS_DIR, "reviews.jsonl")
 
 BACKUP_DIR = os.path.join(REVIEWS_DIR, "backups")
-os.makedirs(BACKUP_DIR, exist_ok=True)
+CACHE_DIR = "cache"
+
+PRICE_PHOTO = os.path.join(PRICE_DIR, "price.jpg")
+PLACE_PHOTO = os.path.join(RECORDS_DIR, "place.jpg")
+WELCOME_PHOTO = os.path.join(FLASH_DIR, "flash.jpg")
+SLOTS_FILE = os.path.join(RECORDS_DIR, "slots.json")
+
+# Кэш file_id: фото загружается в Telegram один раз, дальше отправляется по id
+if database is not None:
+    media_cache = SqliteMediaCache(database)
+else:
+    media_cache = Lazy(lambda: MediaCache(os.path.join(CACHE_DIR, "media_index.json")))
 
 
 def get_environment_info():
@@ -64,17 +405,22 @@ def get_environment_info():
     return {
         'environment': RAILWAY_ENVIRONMENT,
         'webhook_url': WEBHOOK_URL,
-        'port': PORT
+        'port': PORT,
+        'max_reviews': REVIEWS_PAGE_SIZE,
+        'backup_retention_days': BACKUP_RETENTION_DAYS
     }
 
 def setup_webhook():
-    """Настройка вебхука для Railway"""
+    """Настройка вебхука для Railway: setWebhook только если адрес изменился"""
     if WEBHOOK_URL:
         try:
-            bot.remove_webhook()
-            time.sleep(1)
             webhook_url = f"{WEBHOOK_URL}/{TOKEN}"
-            bot.set_webhook(url=webhook_url)
+            info = bot.get_webhook_info()
+            if info.url == webhook_url and sorted(info.allowed_updates or []) == sorted(ALLOWED_UPDATES):
+                print(f"✅ Webhook уже установлен: {webhook_url}")
+                return True
+            # setWebhook заменяет прежний адрес, удалять его заранее не нужно
+            bot.set_webhook(url=webhook_url, allowed_updates=ALLOWED_UPDATES)
             print(f"✅ Webhook установлен: {webhook_url}")
             return True
         except Exception as e:
@@ -85,15 +431,10 @@ def setup_webhook():
         return False
 
 def start_polling():
-    """Запуск polling с обработкой ошибок"""
-    while True:
-        try:
-            print("🔄 Запуск бота в режиме polling...")
-            bot.polling(none_stop=True, timeout=30, long_polling_timeout=10)
-        except Exception as e:
-            print(f"❌ Ошибка polling: {e}")
-            print("🔄 Перезапуск через 10 секунд...")
-            time.sleep(10)
+    """Long polling: апдейты обрабатывает тот же пул, что и вебхуки"""
+    update_dispatcher.start()
+    print(f"🔄 Запуск бота в режиме polling (смещение: {poller.offset or 'с начала'})...")
+    poller.run()
 
 # ==================== FLASK ROUTES ====================
 @app.route('/')
@@ -109,6 +450,7 @@ def home():
     <hr>
     <p><a href="/env">Просмотр переменных окружения</a></p>
     <p><a href="/health">Проверка здоровья</a></p>
+    <p><a href="/metrics">Метрики</a></p>
     """
 
 @app.route('/env')
@@ -116,7 +458,6 @@ def show_environment():
     """Показать переменные окружения (без чувствительных данных)"""
     env_info = get_environment_info()
     return {
-        'bot_name': env_info['bot_name'],
         'environment': env_info['environment'],
         'webhook_enabled': bool(WEBHOOK_URL),
         'max_reviews_per_page': env_info['max_reviews'],
@@ -128,13 +469,17 @@ def show_environment():
 def health_check():
     """Health check для Railway"""
     try:
+        # Пока идёт прогрев, трафик на этот экземпляр не направляем
+        if not boot.ready:
+            return {"status": "starting", "boot": boot.status()}, 503
+        
         # Проверяем доступность основных директорий
         required_dirs = [PRICE_DIR, REVIEWS_DIR, RECORDS_DIR, BACKUP_DIR]
         dirs_status = all(os.path.exists(dir_path) for dir_path in required_dirs)
         
         # Проверяем наличие основных файлов
         files_status = all([
-            os.path.exists(REVIEWS_FILE) or not reviews_list,
+            os.path.exists(REVIEWS_LOG_FILE) or not review_store,
             True  # Фото файлы могут отсутствовать изначально
         ])
         
@@ -143,252 +488,548 @@ def health_check():
             "timestamp": datetime.now().isoformat(),
             "directories": dirs_status,
             "files": files_status,
-            "reviews_count": len(reviews_list),
-            "environment": RAILWAY_ENVIRONMENT
+            "reviews_count": len(review_store),
+            "environment": RAILWAY_ENVIRONMENT,
+            "boot": boot.status()
         }
         
         return status, 200
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}, 500
 
+@app.route('/metrics')
+def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def profile_access():
+    """None — доступ есть, иначе ответ с ошибкой. Без PROFILE_TOKEN маршруты выключены"""
+    if not PROFILE_TOKEN:
+        return {'error': 'not found'}, 404
+    token = request.headers.get('X-Profile-Token', '')
+    if not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        return {'error': 'forbidden'}, 403
+    return None
+
+@app.route('/debug/profile', methods=['POST'])
+def start_profile():
+    """Включить профилирование обработки апдейтов на ?seconds= секунд"""
+    denied = profile_access()
+    if denied:
+        return denied
+    try:
+        seconds = min(float(request.args.get('seconds', 30)), PROFILE_MAX_SECONDS)
+    except ValueError:
+        return {'error': 'seconds должно быть числом'}, 400
+    if seconds <= 0:
+        return {'error': 'seconds должно быть больше нуля'}, 400
+    path = profiler.start(seconds)
+    if path is None:
+        return {'status': 'busy', 'file': os.path.basename(profiler.running)}, 409
+    return {'status': 'started', 'seconds': seconds, 'file': os.path.basename(path)}
+
+@app.route('/debug/profile/<name>')
+def download_profile(name):
+    """Готовый профиль или журнал медленных апдейтов (slow_updates.jsonl)"""
+    denied = profile_access()
+    if denied:
+        return denied
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, mimetype='text/plain')
+
 @app.route(f'/{TOKEN}', methods=['POST'])
 def webhook():
-    """Обработчик вебхука для Railway"""
+    """Обработчик вебхука для Railway: апдейт ставится в очередь, ответ — сразу"""
     if request.headers.get('content-type') == 'application/json':
-        json_string = request.get_data().decode('utf-8')
-        update = telebot.types.Update.de_json(json_string)
-        bot.process_new_updates([update])
+        try:
+            data = json.loads(request.get_data().decode('utf-8'))
+            if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+                raise ValueError("нет update_id")
+            update = telebot.types.Update.de_json(data)
+        except Exception as e:
+            print(f"⚠️ Некорректный апдейт: {e}")
+            return 'Bad Request', 400
+        
+        if not update_dispatcher.submit(update):
+            # Очередь переполнена — Telegram повторит доставку позже
+            return 'Busy', 503
         return ''
     return 'OK'
 
 
+def send_cached_photo(chat_id, path, caption=None, reply_markup=None):
+    """Отправка фото по file_id из кэша, с загрузкой файла только при промахе"""
+    file_id = media_cache.get(path)
+    if file_id:
+        try:
+            return bot.send_photo(chat_id, file_id, caption, reply_markup=reply_markup)
+        except telebot.apihelper.ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            print(f"⚠️ file_id для {path} больше не действителен: {e}")
+            media_cache.invalidate(path)
+
+    with open(path, 'rb') as photo:
+        sent = bot.send_photo(chat_id, photo, caption, reply_markup=reply_markup)
+    media_cache.put(path, sent.photo[-1].file_id)
+    return sent
+
+
+# ==================== ОКНА ДЛЯ ЗАПИСИ ====================
+# Расписание хранится окнами по датам; пока окон нет, клиентам показывается фото place.jpg
+def open_slot_store():
+    if database is None:
+        return SlotStore(SLOTS_FILE)
+    
+    # В общей базе: один раз переносим окна из slots.json
+    store = SqliteSlotStore(database)
+    def load_file():
+        return [slot for slots in SlotStore(SLOTS_FILE).between(date.min, date.max).values() for slot in slots]
+    imported = store.import_once(load_file)
+    if imported:
+        print(f"📦 Окна перенесены в базу: {imported}")
+    return store
+
+slot_store = Lazy(open_slot_store)
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+def day_label(day):
+    return f"{WEEKDAYS[day.weekday()]} {day:%d.%m}"
+
+def has_slots():
+    return len(slot_store) > 0
+
+# Версия хранилища входит в ключ кэша: после любого изменения окон
+# сообщения строятся заново, а старые записи вытесняются
+@functools.lru_cache(maxsize=128)
+def render_slot_week(version, today, start):
+    """Неделя свободных окон для клиента: текст и инлайн-клавиатура по дням"""
+    end = start + timedelta(days=6)
+    days = slot_store.between(max(start, today), end)
+
+    lines = [f"📅 Свободные окна {start:%d.%m}–{end:%d.%m}\n"]
+    markup = types.InlineKeyboardMarkup(row_width=4)
+    buttons = []
+    for day, slots in days.items():
+        free = [slot['time'] for slot in slots if not slot['booked']]
+        if free:
+            lines.append(f"{day_label(day)}: {', '.join(free)}")
+            buttons.append(types.InlineKeyboardButton(day_label(day), callback_data=f"slots_day_{day.isoformat()}"))
+    if not buttons:
+        lines.append("На этой неделе свободных окон нет")
+        upcoming = slot_store.next_free_date(end)
+        if upcoming:
+            lines.append(f"Ближайшее свободное окно: {day_label(upcoming)}")
+    else:
+        lines.append("\nВыберите день, чтобы посмотреть подробнее")
+    markup.add(*buttons)
+
+    navigation = []
+    if start > week_start(today):
+        navigation.append(types.InlineKeyboardButton("◀️ Пред. неделя", callback_data=f"slots_week_{(start - timedelta(days=7)).isoformat()}"))
+    if slot_store.next_free_date(end):
+        navigation.append(types.InlineKeyboardButton("След. неделя ▶️", callback_data=f"slots_week_{(end + timedelta(days=1)).isoformat()}"))
+    if navigation:
+        markup.row(*navigation)
+    return "\n".join(lines), markup.to_json()
+
+@functools.lru_cache(maxsize=128)
+def render_slot_day(version, day):
+    """Окна одного дня для клиента"""
+    lines = [f"📅 {day_label(day)}.{day:%Y}\n"]
+    for slot in slot_store.day(day):
+        status = "🔴 занято" if slot['booked'] else "🟢 свободно"
+        lines.append(f"{slot['time']} ({slot['duration']} мин) — {status}")
+    if len(lines) == 1:
+        lines.append("Окон на этот день нет")
+    lines.append(f"\nДля записи напишите мастеру: {MASTER_CONTACT}")
+    markup = types.InlineKeyboardMarkup()
+    markup.row(types.InlineKeyboardButton("⬅️ К неделе", callback_data=f"slots_week_{week_start(day).isoformat()}"))
+    return "\n".join(lines), markup.to_json()
+
+@functools.lru_cache(maxsize=16)
+def render_slot_schedule(version, today, days=14):
+    """Все окна на ближайшие дни для мастера, включая занятые"""
+    lines = [f"🗓 Окна на {days} дн.\n"]
+    for day, slots in slot_store.between(today, today + timedelta(days=days - 1)).items():
+        times = ", ".join(f"{'🔴' if slot['booked'] else '🟢'}{slot['time']}" for slot in slots)
+        lines.append(f"{day_label(day)}: {times}")
+    if len(lines) == 1:
+        lines.append("Окон пока нет")
+    return "\n".join(lines)
+
+def parse_slot_day(text, today):
+    """Дата в виде ДД.ММ или ДД.ММ.ГГГГ; без года — ближайшая такая дата"""
+    try:
+        return datetime.strptime(text, "%d.%m.%Y").date()
+    except ValueError:
+        pass
+    parsed = datetime.strptime(text, "%d.%m")
+    day = date(today.year, parsed.month, parsed.day)
+    if day < today:
+        day = date(today.year + 1, parsed.month, parsed.day)
+    return day
+
+def apply_slot_command(line, today):
+    """Одна строка команды мастера; вернуть (появилось ли свободное окно, текст результата)"""
+    parts = line.split()
+    if len(parts) < 3 or parts[0] not in ("+", "-", "*"):
+        return False, f"❓ Не понял строку: {line}"
+    try:
+        day = parse_slot_day(parts[1], today)
+        start = datetime.strptime(parts[2], "%H:%M").strftime("%H:%M")
+        duration = int(parts[3]) if len(parts) > 3 else SLOT_DEFAULT_DURATION
+    except ValueError:
+        return False, f"❌ Неверная дата, время или длительность: {line}"
+
+    if parts[0] == "+":
+        if day < today:
+            return False, f"❌ Дата уже прошла: {line}"
+        if slot_store.add(day, start, duration):
+            return True, f"✅ Добавлено {day_label(day)} {start}"
+        return False, f"⚠️ Окно {day_label(day)} {start} уже есть"
+    if parts[0] == "-":
+        if slot_store.remove(day, start):
+            reminders.cancel(appointment_id(day, start))
+            return False, f"🗑 Удалено {day_label(day)} {start}"
+        return False, f"⚠️ Окна {day_label(day)} {start} нет"
+
+    slot = next((slot for slot in slot_store.day(day) if slot['time'] == start), None)
+    if slot is None:
+        return False, f"⚠️ Окна {day_label(day)} {start} нет"
+    slot_store.set_booked(day, start, not slot['booked'])
+    if slot['booked']:
+        # Окно освободилось — запись клиента, если была, отменена
+        reminders.cancel(appointment_id(day, start))
+    return slot['booked'], f"{'🟢 Освобождено' if slot['booked'] else '🔴 Занято'} {day_label(day)} {start}"
+
+def send_slot_calendar(chat_id, caption=None):
+    """Календарь текущей недели одним текстовым сообщением"""
+    today = date.today()
+    text, markup = render_slot_week(slot_store.version, today, week_start(today))
+    if caption:
+        text = f"{caption}\n\n{text}"
+    return bot.send_message(chat_id, text, reply_markup=markup)
+
+
 # Функция для загрузки отзывов
 def load_reviews():
-    try:
-        with open(REVIEWS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+    """Открывает журнал отзывов, при первом запуске переносит старый reviews.json.
 
-# Функция для сохранения отзывов
-def save_reviews(reviews):
-    with open(REVIEWS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(reviews, f, ensure_ascii=False, indent=2)
+    Журнал читается при первом обращении (или во время прогрева), а не при импорте.
+    """
+    return Lazy(open_review_store)
+
+def open_review_store():
+    if database is None:
+        return ReviewStore(REVIEWS_LOG_FILE, legacy_file=REVIEWS_FILE, flush_interval=REVIEWS_FLUSH_INTERVAL)
+    
+    # В общей базе: один раз переносим отзывы из файлового журнала
+    store = SqliteReviewStore(database)
+    def load_files():
+        file_store = ReviewStore(REVIEWS_LOG_FILE, legacy_file=REVIEWS_FILE, flush_interval=REVIEWS_FLUSH_INTERVAL)
+        try:
+            return list(file_store)
+        finally:
+            file_store.close()
+    if os.path.exists(REVIEWS_LOG_FILE) or os.path.exists(REVIEWS_FILE):
+        imported = store.import_once(load_files)
+        if imported is not None:
+            print(f"📦 Перенесено в базу отзывов: {imported}")
+    return store
 
 master_list = []
 
-master_data = {}
-user_data = {}
-reviews_list = load_reviews()
+master_data = SqliteStateStore(database, 'master_data', ttl=0) if database is not None else {}
+review_store = load_reviews()
+review_snapshots = ReviewSnapshots(
+    review_store,
+    BACKUP_DIR,
+    interval=BACKUP_INTERVAL_HOURS * 3600,
+    retention_days=BACKUP_RETENTION_DAYS,
+    full_every=BACKUP_FULL_EVERY
+)
+
+metrics_registry.gauge('bot_webhook_queue_depth', 'Апдейтов в очереди обработки', update_dispatcher.depth)
+metrics_registry.gauge('bot_reviews_count', 'Отзывов в хранилище', lambda: len(review_store))
+
+def deliver_place(chat_id, caption):
+    """Отправка свободных мест подписчику; False — чат недоступен"""
+    try:
+        if has_slots():
+            send_slot_calendar(chat_id, caption)
+        else:
+            send_cached_photo(chat_id, PLACE_PHOTO, caption)
+        return True
+    except telebot.apihelper.ApiTelegramException as e:
+        # 403 — бот заблокирован или пользователь удалён, 400 — чата больше нет
+        if e.error_code == 403 or (e.error_code == 400 and 'chat not found' in e.description.lower()):
+            return False
+        raise
+
+def open_chat_list(name):
+    """Список чатов: файл state/<name>.json или, в режиме sqlite, общая база"""
+    path = os.path.join(STATE_DIR, f"{name}.json")
+    if database is None:
+        return SubscriberRegistry(path)
+    registry = SqliteSubscriberRegistry(database, name)
+    registry.import_once(lambda: SubscriberRegistry(path).chat_ids())
+    return registry
+
+# Подписчики на уведомления и рассылка, которая переживает перезапуск
+subscribers = Lazy(lambda: open_chat_list("subscribers"))
+place_broadcaster = Broadcaster(
+    deliver_place,
+    subscribers,
+    os.path.join(STATE_DIR, "broadcast_job.json"),
+    workers=BROADCAST_WORKERS
+)
+metrics_registry.gauge('bot_subscribers_count', 'Подписчиков на уведомления', lambda: len(subscribers))
+metrics_registry.gauge('bot_broadcast_pending', 'Чатов в очереди рассылки', place_broadcaster.pending)
+
+def format_hours(hours):
+    return f"{hours:g} ч" if hours >= 1 else f"{hours * 60:.0f} мин"
+
+def send_reminder(chat_id, label, at, offset):
+    """Напоминание о визите; недоступный чат не повторяем"""
+    left = max(at - time.time(), 0) / 3600
+    try:
+        bot.send_message(chat_id, f"⏰ Напоминаем: вы записаны на ресницы {label} (через {format_hours(left)})\n"
+                                  f"Если планы изменились, сообщите мастеру: {MASTER_CONTACT}")
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code == 403 or (e.error_code == 400 and 'chat not found' in e.description.lower()):
+            print(f"⚠️ Напоминание не доставлено, чат {chat_id} недоступен")
+            return
+        raise
+
+# Записи клиентов на окна и напоминания о них; id записи — дата и время окна
+def open_reminders():
+    path = os.path.join(STATE_DIR, "reminders.json")
+    offsets = [hours * 3600 for hours in REMINDER_OFFSETS_HOURS]
+    if database is None:
+        return ReminderScheduler(send_reminder, path, offsets, workers=REMINDER_WORKERS)
+    
+    # В общей базе: один раз переносим записи из reminders.json
+    scheduler = SqliteReminderScheduler(database, send_reminder, offsets, workers=REMINDER_WORKERS)
+    scheduler.import_once(lambda: ReminderScheduler(send_reminder, path, offsets).appointments())
+    return scheduler
+
+reminders = Lazy(open_reminders)
+metrics_registry.gauge('bot_reminders_pending', 'Напоминаний в очереди', lambda: reminders.pending())
+
+def appointment_id(day, start):
+    return f"{day.isoformat()} {start}"
+
+
 @bot.message_handler(commands=['start'])
 def start(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn1 = types.KeyboardButton("Клиент")
-    btn2 = types.KeyboardButton("Мастер")
-    markup.add(btn1, btn2)
-    bot.send_message(message.chat.id, "Здравствуйте, выберете роль", reply_markup=markup)
+    bot.send_message(message.chat.id, "Здравствуйте, выберете роль", reply_markup=ROLE_KEYBOARD)
 
-@bot.message_handler(func=lambda message:message.text == "Мастер")
+@text_router.route("Мастер")
 def password_request(message):
-    password = bot.send_message(message.chat.id, "Авторизируйтесь", reply_markup=ReplyKeyboardRemove())
+    password = bot.send_message(message.chat.id, "Авторизируйтесь", reply_markup=REMOVE_KEYBOARD)
     bot.register_next_step_handler(password, masterauto)
+@track_handler
 def masterauto(message):
     password = message.text
     if password == MASTER_PASSWORD:
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn = types.KeyboardButton("🏠 Зайти в меню мастера")
-        markup.add(btn)
-        bot.send_message(message.chat.id, "Успешно" ,reply_markup=markup)
+        bot.send_message(message.chat.id, "Успешно", reply_markup=MASTER_ENTER_KEYBOARD)
     else:
         bot.send_message(message.chat.id, "Авторизация не пройдена")
         start(message)
 
-@bot.message_handler(func=lambda message:message.text == "🏠 Зайти в меню мастера")
+@text_router.route("🏠 Зайти в меню мастера")
 def master_menu(message):
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn1 = types.KeyboardButton("💸 Установить прайс")
-        btn2 = types.KeyboardButton("✍️ Обновить свободные места")
-        btn3 = types.KeyboardButton("📅 Посмотреть текущие свободные места и прайс")
-        btn4 = types.KeyboardButton("⭐️ Отзывы")
-        markup.add(btn1)
-        markup.row(btn2)
-        markup.row(btn3)
-        markup.row(btn4)
-        bot.send_message(message.chat.id, "Выберите действие", reply_markup=markup)
-
-@bot.message_handler(func=lambda message:message.text == "✍️ Обновить свободные места")
+        bot.send_message(message.chat.id, MENU_PROMPT, reply_markup=MASTER_MENU_KEYBOARD)
+
+@text_router.route("✍️ Обновить свободные места")
 def request_place(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn = types.KeyboardButton("🏠 Выйти в меню мастера")
-    markup.add(btn)
-    msg = bot.send_message(message.chat.id, "Отправьте фото с обновленными местами или выйдите в меню мастера", reply_markup=markup)
+    if has_slots():
+        # Пока есть окна, клиенты видят календарь, а не фото — меняем то, что они увидят
+        bot.send_message(
+            message.chat.id,
+            "🗓 Клиентам сейчас показываются окна для записи, фото мест используется, только когда окон нет. "
+            "Измените окна:"
+        )
+        request_slots(message)
+        return
+    msg = bot.send_message(message.chat.id, "Отправьте фото с обновленными местами или выйдите в меню мастера", reply_markup=MASTER_EXIT_KEYBOARD)
     bot.register_next_step_handler(msg, process_request_place)
+@track_handler
 def process_request_place(message):
     if message.text == "🏠 Выйти в меню мастера":
         master_menu(message)
     else:
         place(message)
 
-@bot.message_handler(content_types=['photo'])
-def place(message):
+def file_url(file_path):
+    """Ссылка на скачивание файла из Telegram"""
+    if apihelper.FILE_URL:
+        return apihelper.FILE_URL.format(TOKEN, file_path)
+    return f"https://api.telegram.org/file/bot{TOKEN}/{file_path}"
+
+def save_master_photo(message, file_path, data_key, done_text):
+    """Общий приём фото от мастера: потоковое скачивание, сжатие и атомарная замена файла"""
+    saved = False
     try:
         if message.photo:
             # Получаем фото с наилучшим качеством (последний элемент в списке)
             file_info = bot.get_file(message.photo[-1].file_id)
-            downloaded_file = bot.download_file(file_info.file_path)
-            
-            # Фиксированное имя файла
-            file_extension = file_info.file_path.split('.')[-1]
-            filename = f"place.{file_extension}"  # Полностью фиксированное имя
-            file_path = os.path.join(RECORDS_DIR, filename)
+            download_start = time.perf_counter()
+            ingest_photo(
+                http_session,
+                file_url(file_info.file_path),
+                file_path,
+                timeout=(TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT),
+                max_side=PHOTO_MAX_SIDE,
+                quality=PHOTO_QUALITY
+            )
+            API_LATENCY.observe(time.perf_counter() - download_start, 'downloadFile')
+            media_cache.invalidate(file_path)
             
-            # Удаляем старое фото если оно существует
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    print(f"Удалено старое фото: {filename}")
-                except Exception as e:
-                    print(f"Ошибка при удалении старого фото: {e}")
-            
-            # Сохраняем новое фото
-            with open(file_path, 'wb') as new_file:
-                new_file.write(downloaded_file)
-            
-            # Обновляем информацию в master_data
             # Теперь храним только одно фото для всех
-            master_data['current_place'] = {
-                'filename': filename,
+            master_data[data_key] = {
+                'filename': os.path.basename(file_path),
                 'file_path': file_path,
                 'timestamp': message.date,
                 'set_by': message.from_user.id
             }
             
-            bot.reply_to(message, "✅ Места обновлены")
-            master_menu(message)
+            bot.reply_to(message, done_text)
+            saved = True
         else:
             bot.reply_to(message, "❌ Пожалуйста, отправьте фото.")
-            master_menu(message)
     except Exception as e:
         bot.reply_to(message, f"❌ Ошибка при сохранении фото: {str(e)}")
+    master_menu(message)
+    return saved
+
+@media_task
+def place(message):
+    """Фото мест от мастера; вызывается только из process_request_place"""
+    if has_slots():
+        # Окна появились, пока мастер выбирал фото: клиенты фото всё равно не увидят
+        bot.send_message(message.chat.id, "🗓 Клиентам показываются окна для записи, фото мест не сохранено")
         master_menu(message)
+        return
+    if save_master_photo(message, PLACE_PHOTO, 'current_place', "✅ Места обновлены"):
+        recipients = place_broadcaster.start("🔔 Обновились свободные места")
+        if recipients:
+            bot.send_message(message.chat.id, f"📣 Рассылаем новые места подписчикам: {recipients}")
 
 
-@bot.message_handler(func=lambda message:message.text == "📅 Посмотреть текущие свободные места и прайс")
+@text_router.route("📅 Посмотреть текущие свободные места и прайс")
 def see(message):
-    with open('records/place.jpg', 'rb') as photo1:
-        bot.send_photo(message.chat.id, photo1, "📅 Текущие свободные места")
-    with open('price_photo/price.jpg', 'rb') as photo2:
-            bot.send_photo(message.chat.id, photo2, "Текущий прайс 💸")
+    if has_slots():
+        bot.send_message(message.chat.id, render_slot_schedule(slot_store.version, date.today()))
+    else:
+        send_cached_photo(message.chat.id, PLACE_PHOTO, "📅 Текущие свободные места")
+    # Клавиатура меню едет вместе с фото, отдельное сообщение не нужно
+    send_cached_photo(message.chat.id, PRICE_PHOTO, "Текущий прайс 💸", reply_markup=MASTER_MENU_KEYBOARD)
+
+@text_router.route("🗓 Окна для записи")
+def request_slots(message):
+    bot.send_message(message.chat.id, render_slot_schedule(slot_store.version, date.today()))
+    msg = bot.send_message(
+        message.chat.id,
+        "Отправьте изменения, по одному окну в строке:\n"
+        f"+ 20.10 14:00 90 — добавить окно (длительность в минутах, по умолчанию {SLOT_DEFAULT_DURATION})\n"
+        "- 20.10 14:00 — удалить окно\n"
+        "* 20.10 14:00 — отметить занятым или снова свободным",
+        reply_markup=MASTER_EXIT_KEYBOARD
+    )
+    bot.register_next_step_handler(msg, process_slot_commands)
+
+@track_handler
+def process_slot_commands(message):
+    if message.text == "🏠 Выйти в меню мастера" or not message.text:
+        master_menu(message)
+        return
+    
+    today = date.today()
+    added = False
+    results = []
+    for line in message.text.splitlines():
+        if line.strip():
+            opened, result = apply_slot_command(line.strip(), today)
+            added = added or opened
+            results.append(result)
+    bot.send_message(message.chat.id, "\n".join(results))
+    
+    # О новых свободных окнах сообщаем подписчикам
+    if added:
+        recipients = place_broadcaster.start("🔔 Появились новые окна для записи")
+        if recipients:
+            bot.send_message(message.chat.id, f"📣 Рассылаем новые окна подписчикам: {recipients}")
     master_menu(message)
 
-@bot.message_handler(func=lambda message:message.text == "💸 Установить прайс")
+@text_router.route("💸 Установить прайс")
 def request_price(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn = types.KeyboardButton("🏠 Выйти в меню мастера")
-    markup.add(btn)
-    msg = bot.send_message(message.chat.id, "Отправьте фото с прайсом или выйдите в меню мастера", reply_markup=markup)
+    msg = bot.send_message(message.chat.id, "Отправьте фото с прайсом или выйдите в меню мастера", reply_markup=MASTER_EXIT_KEYBOARD)
     bot.register_next_step_handler(msg, process_request_price)
 
+@track_handler
 def process_request_price(message):
     if message.text == "🏠 Выйти в меню мастера":
         master_menu(message)
     else:
         price(message)
 
-@bot.message_handler(content_types=['photo'])
+@media_task
 def price(message):
-    try:
-        if message.photo:
-            # Получаем фото с наилучшим качеством (последний элемент в списке)
-            file_info = bot.get_file(message.photo[-1].file_id)
-            downloaded_file = bot.download_file(file_info.file_path)
-            
-            # Фиксированное имя файла
-            file_extension = file_info.file_path.split('.')[-1]
-            filename = f"price.{file_extension}"  # Полностью фиксированное имя
-            file_path = os.path.join(PRICE_DIR, filename)
-            
-            # Удаляем старое фото если оно существует
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    print(f"Удалено старое фото: {filename}")
-                except Exception as e:
-                    print(f"Ошибка при удалении старого фото: {e}")
-            
-            # Сохраняем новое фото
-            with open(file_path, 'wb') as new_file:
-                new_file.write(downloaded_file)
-            
-            # Обновляем информацию в master_data
-            # Теперь храним только одно фото для всех
-            master_data['current_price'] = {
-                'filename': filename,
-                'file_path': file_path,
-                'timestamp': message.date,
-                'set_by': message.from_user.id
-            }
-            
-            bot.reply_to(message, "✅ Прайс установлен")
-            master_menu(message)
-        else:
-            bot.reply_to(message, "❌ Пожалуйста, отправьте фото.")
-            master_menu(message)
-    except Exception as e:
-        bot.reply_to(message, f"❌ Ошибка при сохранении фото: {str(e)}")
-        master_menu(message)
+    """Фото прайса от мастера; вызывается только из process_request_price"""
+    save_master_photo(message, PRICE_PHOTO, 'current_price', "✅ Прайс установлен")
+
+# Фото вне диалога мастера (в том числе от клиентов) ничего не меняет
+@bot.message_handler(content_types=['photo'])
+def unexpected_photo(message):
+    bot.send_message(message.chat.id, "📷 Фото здесь не нужно — выберите действие в меню")
 
-@bot.message_handler(func=lambda message: message.text == "⭐️ Отзывы")
+@text_router.route("⭐️ Отзывы")
 def master_reviews_menu(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn1 = types.KeyboardButton("📊 Статистика отзывов")
-    btn2 = types.KeyboardButton("📝 Посмотреть все отзывы")
-    btn3 = types.KeyboardButton("🏠 Выйти в меню мастера")
-    btn4 = types.KeyboardButton("🗑️ Удалить все отзывы")
-    markup.add(btn1, btn2)
-    markup.row(btn4)
-    markup.row(btn3)
-    
-    total_reviews = len(reviews_list)
-    if total_reviews > 0:
-        avg_rating = sum(r.get('rating', 5) for r in reviews_list) / total_reviews
+    stats = review_store.stats
+    if stats.total > 0:
         bot.send_message(
             message.chat.id,
-            f"📊 У вас {total_reviews} отзывов\n"
-            f"⭐ Средний рейтинг: {avg_rating:.1f}/5",
-            reply_markup=markup
+            f"📊 У вас {stats.total} отзывов\n"
+            f"⭐ Средний рейтинг: {stats.average:.1f}/5",
+            reply_markup=MASTER_REVIEWS_KEYBOARD
         )
     else:
-        bot.send_message(message.chat.id, "📝 У вас пока нет отзывов", reply_markup=markup)
+        bot.send_message(message.chat.id, "📝 У вас пока нет отзывов", reply_markup=MASTER_REVIEWS_KEYBOARD)
 
-@bot.message_handler(func=lambda message: message.text == "🏠 Выйти в меню мастера")
+@text_router.route("🏠 Выйти в меню мастера")
 def back_master(message):
     master_menu(message)
-@bot.message_handler(func=lambda message: message.text == "📊 Статистика отзывов")
+@text_router.route("📊 Статистика отзывов")
 def show_statistics(message):
-    if not reviews_list:
+    stats = review_store.stats
+    if not stats.total:
         bot.send_message(message.chat.id, "📝 Отзывов пока нет")
         master_reviews_menu(message)
         return
     
-    total = len(reviews_list)
-    rating_counts = {1:0, 2:0, 3:0, 4:0, 5:0}
-    
-    for review in reviews_list:
-        rating = review.get('rating', 5)
-        rating_counts[rating] = rating_counts.get(rating, 0) + 1
-    
+    total = stats.total
     stats_text = f"📊 **Статистика отзывов:**\n\n"
     stats_text += f"📝 Всего отзывов: {total}\n"
+    stats_text += f"⭐ Средний рейтинг: {stats.average:.1f}/5\n\n"
     
-    if any(review.get('rating') for review in reviews_list):
-        avg_rating = sum(r.get('rating', 5) for r in reviews_list) / total
-        stats_text += f"⭐ Средний рейтинг: {avg_rating:.1f}/5\n\n"
-        
-        for rating in range(5, 0, -1):
-            count = rating_counts[rating]
-            percentage = (count / total) * 100
-            stats_text += f"{'⭐' * rating}: {count} ({percentage:.1f}%)\n"
+    for rating in range(5, 0, -1):
+        count = stats.histogram.get(rating, 0)
+        percentage = (count / total) * 100
+        stats_text += f"{'⭐' * rating}: {count} ({percentage:.1f}%)\n"
+    
+    # Динамика рейтинга по неделям и месяцам
+    weekly = stats.weekly_trend()
+    if weekly:
+        stats_text += "\n📈 По неделям:\n"
+        for week, count, avg in weekly:
+            stats_text += f"{week}: {count} шт., ⭐ {avg:.1f}\n"
+    monthly = stats.monthly_trend()
+    if monthly:
+        stats_text += "\n🗓 По месяцам:\n"
+        for month, count, avg in monthly:
+            stats_text += f"{month}: {count} шт., ⭐ {avg:.1f}\n"
     
     bot.send_message(message.chat.id, stats_text, parse_mode='Markdown')
     master_reviews_menu(message)
@@ -397,150 +1038,431 @@ def show_statistics(message):
 
 
 
-@bot.message_handler(func=lambda message: message.text == "📝 Посмотреть все отзывы")
+def format_review(number, review, limit):
+    """Текст одного отзыва для страницы, не длиннее limit символов"""
+    user_name = html.escape(str(review.get('user_name', 'Аноним'))[:64])
+    rating = review.get('rating', 5)
+    date = html.escape(str(review.get('date', 'Неизвестно')))
+    head = f"<b>Отзыв #{number}</b>\n⭐ Оценка: {rating}/5\n💬 "
+    tail = f"\n👤 {user_name}\n📅 {date}\n────────────────────"
+
+    # Длинный текст обрезаем так, чтобы страница влезла в одно сообщение
+    room = max(limit - len(head) - len(tail), 0)
+    text = str(review.get('text') or '')
+    escaped = html.escape(text)
+    if len(escaped) <= room:
+        return head + escaped + tail
+    if room < 1:
+        # Даже «…» не помещается — отзыв без текста
+        return head + tail
+    # Каждый шаг строго укорачивает текст, на пустом «…» цикл заканчивается
+    while len(escaped) > room:
+        text = text[:max(min(len(text) * room // len(escaped), len(text)) - 1, 0)]
+        escaped = html.escape(text) + '…'
+    return head + escaped + tail
+
+
+def render_reviews_page(offset=0, rating=None):
+    """Страница отзывов и инлайн-клавиатура навигации"""
+    total = review_store.count(rating)
+    if offset >= total:
+        offset = max((total - 1) // REVIEWS_PAGE_SIZE * REVIEWS_PAGE_SIZE, 0)
+    page = review_store.newest(offset, REVIEWS_PAGE_SIZE, rating)
+
+    filter_label = f" с оценкой {rating}⭐" if rating else ""
+    if page:
+        header = f"📝 Отзывы{filter_label}: {offset + 1}–{offset + len(page)} из {total}\n\n"
+    else:
+        header = f"📝 Отзывов{filter_label} нет\n"
+    limit = (MESSAGE_LIMIT - len(header)) // REVIEWS_PAGE_SIZE - 2
+    text = header + "\n\n".join(format_review(number, review, limit) for number, review in page)
+
+    rating_key = rating or 0
+    markup = types.InlineKeyboardMarkup()
+    filters = [types.InlineKeyboardButton("• Все" if not rating else "Все", callback_data="reviews_0_0")]
+    for value in range(5, 0, -1):
+        label = f"{value}⭐"
+        filters.append(types.InlineKeyboardButton(f"• {label}" if value == rating else label, callback_data=f"reviews_0_{value}"))
+    markup.row(*filters)
+
+    pages = max((total + REVIEWS_PAGE_SIZE - 1) // REVIEWS_PAGE_SIZE, 1)
+    navigation = []
+    if offset > 0:
+        navigation.append(types.InlineKeyboardButton("⬅️", callback_data=f"reviews_{max(offset - REVIEWS_PAGE_SIZE, 0)}_{rating_key}"))
+    navigation.append(types.InlineKeyboardButton(f"{offset // REVIEWS_PAGE_SIZE + 1}/{pages}", callback_data="reviews_noop"))
+    if offset + REVIEWS_PAGE_SIZE < total:
+        navigation.append(types.InlineKeyboardButton("➡️", callback_data=f"reviews_{offset + REVIEWS_PAGE_SIZE}_{rating_key}"))
+    markup.row(*navigation)
+    return text, markup
+
+
+@text_router.route("📝 Посмотреть все отзывы")
 def see_rating(message):
-    if not reviews_list:  
+    if not review_store:  
         bot.send_message(message.chat.id, "📝 Отзывов пока нет")
         master_reviews_menu(message)
         return
     
-    for i, review in enumerate(reversed(reviews_list), 1):  # Новые первыми
-        user_name = review.get('user_name', 'Аноним')
-        rating = review.get('rating', 5)
-        text = review.get('text', '')
-        date = review.get('date', 'Неизвестно')
-        
-        review_text = (
-            f"**Отзыв #{i}**\n"
-            f"⭐ Оценка: {rating}/5\n"
-            f"💬 {text}\n"
-            f"👤 {user_name}\n"
-            f"📅 {date}\n"
-            f"────────────────────"
+    # Одно сообщение со страницей отзывов, листается инлайн-кнопками
+    text, markup = render_reviews_page()
+    bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("reviews_"))
+def browse_reviews(call):
+    if call.data == "reviews_noop":
+        bot.answer_callback_query(call.id)
+        return
+    
+    _, offset, rating = call.data.split("_")
+    text, markup = render_reviews_page(int(offset), int(rating) or None)
+    try:
+        bot.edit_message_text(
+            text,
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=markup,
+            parse_mode='HTML'
         )
-        
-        bot.send_message(message.chat.id, review_text, parse_mode='Markdown')
+    except telebot.apihelper.ApiTelegramException as e:
+        # Повторное нажатие на тот же фильтр — текст не изменился
+        if 'message is not modified' not in str(e):
+            raise
+    bot.answer_callback_query(call.id)
+
+@text_router.route("🔎 Поиск отзывов")
+def request_review_search(message):
+    msg = bot.send_message(
+        message.chat.id,
+        "🔎 Введите запрос, условия можно сочетать:\n"
+        "• слова из текста — объём ресницы\n"
+        "• оценка:5 или оценка:1-3\n"
+        "• с:01.09.2026 по:30.09.2026 — даты отзыва\n"
+        "• @Анна или @123456789 — автор по имени или id",
+        reply_markup=MASTER_EXIT_KEYBOARD
+    )
+    bot.register_next_step_handler(msg, process_review_search)
+
+def render_search_page(query, offset=0):
+    """Страница результатов поиска и кнопки навигации"""
+    start = time.perf_counter()
+    total, page = review_store.find(parse_query(query), offset, REVIEWS_PAGE_SIZE)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if page:
+        header = f"🔎 Найдено {total} (за {elapsed:.1f} мс): {offset + 1}–{offset + len(page)}\n\n"
+    else:
+        header = f"🔎 По запросу «{html.escape(query)}» ничего не найдено\n"
+    limit = (MESSAGE_LIMIT - len(header)) // REVIEWS_PAGE_SIZE - 2
+    text = header + "\n\n".join(format_review(number, review, limit) for number, review in page)
+
+    markup = types.InlineKeyboardMarkup()
+    navigation = []
+    if offset > 0:
+        navigation.append(types.InlineKeyboardButton("⬅️", callback_data=f"rsearch_{max(offset - REVIEWS_PAGE_SIZE, 0)}"))
+    if offset + REVIEWS_PAGE_SIZE < total:
+        navigation.append(types.InlineKeyboardButton("➡️", callback_data=f"rsearch_{offset + REVIEWS_PAGE_SIZE}"))
+    if navigation:
+        markup.row(*navigation)
+    return text, markup
+
+@track_handler
+def process_review_search(message):
+    if not message.text:
+        master_menu(message)
+        return
+    if message.text in text_router or message.text.startswith('/'):
+        # Кнопка меню (в том числе «Выйти в меню мастера») или команда завершают
+        # поиск и обрабатываются как обычно — шаг поиска уже снят
+        bot.process_new_messages([message])
+        return
     
-    # После показа всех отзывов возвращаем в меню
-    master_reviews_menu(message)
+    try:
+        text, markup = render_search_page(message.text)
+    except ValueError:
+        text, markup = "❌ Не понял дату или оценку в запросе, попробуйте ещё раз", None
+    else:
+        # Запрос нужен для листания страниц: в callback_data он не поместится
+        user_data[f"search_{message.chat.id}"] = message.text
+    msg = bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')
+    # Можно сразу ввести следующий запрос
+    bot.register_next_step_handler(msg, process_review_search)
 
-@bot.message_handler(func=lambda message: message.text == "🗑️ Удалить все отзывы")
+@bot.callback_query_handler(func=lambda call: call.data.startswith("rsearch_"))
+def browse_search(call):
+    query = user_data.get(f"search_{call.message.chat.id}")
+    if query is None:
+        bot.answer_callback_query(call.id, "Поиск устарел, повторите запрос")
+        return
+    
+    text, markup = render_search_page(query, int(call.data.split("_")[1]))
+    bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup, parse_mode='HTML')
+    bot.answer_callback_query(call.id)
+
+@text_router.route("🗑️ Удалить все отзывы")
 def request_delete_all_reviews(message):
-    if not reviews_list:
+    if not review_store:
         bot.send_message(message.chat.id, "📝 Нет отзывов для удаления")
         master_reviews_menu(message)
         return
     
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn1 = types.KeyboardButton("✅ Да, удалить все")
-    btn2 = types.KeyboardButton("❌ Нет, отменить")
-    markup.add(btn1, btn2)
-    
     bot.send_message(
         message.chat.id,
         f"⚠️ **ВНИМАНИЕ!**\n\n"
-        f"Вы собираетесь удалить ВСЕ отзывы ({len(reviews_list)} шт.).\n"
+        f"Вы собираетесь удалить ВСЕ отзывы ({len(review_store)} шт.).\n"
         f"Это действие нельзя отменить!\n\n"
         f"Вы уверены?",
-        reply_markup=markup,
+        reply_markup=CONFIRM_DELETE_KEYBOARD,
         parse_mode='Markdown'
     )
 
-@bot.message_handler(func=lambda message: message.text == "✅ Да, удалить все")
+@text_router.route("✅ Да, удалить все")
 def confirm_delete_all_reviews(message):
-    # Создаем резервную копию перед удалением
-    backup_file = os.path.join(BACKUP_DIR, f"reviews_backup_{int(time.time())}.json")
-    try:
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(reviews_list, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Ошибка создания бэкапа: {e}")
+    # Создаем резервную копию перед удалением (пишется в фоне)
+    _, reviews = review_store.export()
+    backup_file = review_snapshots.backup(reviews)
     
     # Сохраняем количество отзывов для сообщения
-    deleted_count = len(reviews_list)
+    deleted_count = len(reviews)
     
-    # Очищаем список
-    reviews_list.clear()
-    save_reviews(reviews_list)
+    # Очищаем хранилище
+    review_store.clear()
     
     bot.send_message(
         message.chat.id,
         f"✅ Удалено {deleted_count} отзывов\n"
         f"📁 Создана резервная копия: {backup_file}",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=REMOVE_KEYBOARD
     )
     master_reviews_menu(message)
 
-@bot.message_handler(func=lambda message: message.text == "❌ Нет, отменить")
+def snapshot_label(name):
+    """Подпись снимка для кнопки: дата и тип"""
+    stamp = ReviewSnapshots._stamp(name)
+    moment = datetime.strptime(stamp, "%Y%m%d-%H%M%S-%f").strftime("%d.%m.%Y %H:%M")
+    if name.endswith("_inc.jsonl.gz"):
+        return f"{moment} (изменения)"
+    return f"{moment} (полная)"
+
+@text_router.route("🗂 Резервные копии")
+def list_review_snapshots(message):
+    names = review_snapshots.list_snapshots()[-8:]
+    if not names:
+        bot.send_message(message.chat.id, "📁 Резервных копий пока нет")
+        return
+    
+    markup = types.InlineKeyboardMarkup()
+    for name in reversed(names):
+        markup.row(types.InlineKeyboardButton(snapshot_label(name), callback_data=f"restore_{name}"))
+    bot.send_message(
+        message.chat.id,
+        f"🗂 Резервные копии (хранятся {BACKUP_RETENTION_DAYS} дн.)\n"
+        f"Выберите копию для восстановления:",
+        reply_markup=markup
+    )
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("restore"))
+def restore_review_snapshot(call):
+    if call.data == "restore_cancel":
+        bot.edit_message_text("❌ Восстановление отменено", call.message.chat.id, call.message.message_id)
+    elif call.data.startswith("restore_ok_"):
+        name = call.data[len("restore_ok_"):]
+        bot.edit_message_text("⏳ Восстанавливаем отзывы...", call.message.chat.id, call.message.message_id)
+        chat_id = call.message.chat.id
+        
+        def done(future):
+            try:
+                restored = future.result()
+                bot.send_message(chat_id, f"♻️ Восстановлено {restored} отзывов. Прежние сохранены в новую копию")
+            except Exception as e:
+                bot.send_message(chat_id, f"❌ Не удалось восстановить копию: {e}")
+        review_snapshots.restore(name).add_done_callback(done)
+    else:
+        name = call.data[len("restore_"):]
+        markup = types.InlineKeyboardMarkup()
+        markup.row(
+            types.InlineKeyboardButton("✅ Восстановить", callback_data=f"restore_ok_{name}"),
+            types.InlineKeyboardButton("❌ Отмена", callback_data="restore_cancel")
+        )
+        bot.edit_message_text(
+            f"Заменить текущие отзывы копией от {snapshot_label(name)}?",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=markup
+        )
+    bot.answer_callback_query(call.id)
+
+@text_router.route("📤 Экспорт отзывов")
+def request_review_export(message):
+    if not review_store:
+        bot.send_message(message.chat.id, "📝 У вас пока нет отзывов")
+        return
+    
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton("CSV", callback_data="export_csv_0"),
+        types.InlineKeyboardButton("CSV.gz", callback_data="export_csv_1")
+    )
+    markup.row(
+        types.InlineKeyboardButton("JSONL", callback_data="export_jsonl_0"),
+        types.InlineKeyboardButton("JSONL.gz", callback_data="export_jsonl_1")
+    )
+    bot.send_message(
+        message.chat.id,
+        f"📤 Выгрузить {len(review_store)} отзывов файлом.\n"
+        f"CSV открывается в Excel, JSONL — для программ. .gz — сжатый архив",
+        reply_markup=markup
+    )
+
+def send_review_export(chat_id, fmt, compress):
+    """Записать отзывы во временный файл по одному и отправить документом"""
+    fd, path = tempfile.mkstemp(prefix="export_", dir=CACHE_DIR)
+    os.close(fd)
+    try:
+        count = write_export(review_store.stream(), path, fmt, compress)
+        with open(path, 'rb') as f:
+            bot.send_document(
+                chat_id,
+                f,
+                visible_file_name=export_file_name(fmt, compress, datetime.now()),
+                caption=f"📤 Отзывов в файле: {count}"
+            )
+    finally:
+        os.remove(path)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("export_"))
+def export_reviews(call):
+    _, fmt, compress = call.data.split("_")
+    bot.answer_callback_query(call.id, "⏳ Готовим файл...")
+    
+    def review_export(message):
+        send_review_export(message.chat.id, fmt, compress == "1")
+    # Файл пишется и загружается в пуле передачи файлов, не занимая поток апдейтов
+    media_pool.submit(_run_media_task, review_export, call.message)
+
+@text_router.route("❌ Нет, отменить")
 def cancel_delete_reviews(message):
     bot.send_message(
         message.chat.id,
         "❌ Удаление отменено",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=REMOVE_KEYBOARD
     )
     master_reviews_menu(message)
 
 
-@bot.message_handler(func=lambda message:message.text == "Клиент")
+@text_router.route("Клиент")
 def client(message):
-    with open('welcome/flash.jpg', 'rb') as photo:
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn = types.KeyboardButton("🏠 Зайти в главное меню")
-        markup.add(btn)
-        bot.send_photo(message.chat.id, photo, "Добро пожаловать", reply_markup=markup) 
-@bot.message_handler(func=lambda message:message.text == "🏠 Зайти в главное меню")
+    send_cached_photo(message.chat.id, WELCOME_PHOTO, "Добро пожаловать", reply_markup=CLIENT_ENTER_KEYBOARD)
+@text_router.route("🏠 Зайти в главное меню")
 def client_menu(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn1 = types.KeyboardButton("💸 Ознакомиться с прайсом")
-    btn2 = types.KeyboardButton("✍️ Записаться на ресницы")
-    btn3 = types.KeyboardButton("⭐️ Оставить отзыв")
-    btn4 = types.KeyboardButton("📅 Свободные места")
-    markup.add(btn1)
-    markup.row(btn4)
-    markup.row(btn2)
-    markup.row(btn3)
-    bot.send_message(message.chat.id, "Выберите действие", reply_markup=markup)
-
-@bot.message_handler(func=lambda message:message.text == "💸 Ознакомиться с прайсом")
+    bot.send_message(message.chat.id, MENU_PROMPT, reply_markup=CLIENT_MENU_KEYBOARD)
+
+@text_router.route("💸 Ознакомиться с прайсом")
 def learn_price(message):
-    with open('price_photo/price.jpg', 'rb') as photo:
-        bot.send_photo(message.chat.id, photo)
-    client_menu(message)    
+    send_cached_photo(message.chat.id, PRICE_PHOTO, reply_markup=CLIENT_MENU_KEYBOARD)
 
-@bot.message_handler(func=lambda message:message.text == "📅 Свободные места")
+@text_router.route("📅 Свободные места")
 def see_place(message):
-    with open('records/place.jpg', 'rb') as photo:
-        bot.send_photo(message.chat.id, photo, "Текущая информация может быть не акутальна, при записи уточните")
+    if has_slots():
+        # У календаря свои кнопки, поэтому меню — отдельным сообщением
+        send_slot_calendar(message.chat.id)
+        client_menu(message)
+    else:
+        send_cached_photo(
+            message.chat.id,
+            PLACE_PHOTO,
+            "Текущая информация может быть не акутальна, при записи уточните",
+            reply_markup=CLIENT_MENU_KEYBOARD
+        )
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("slots_"))
+def browse_slots(call):
+    _, view, value = call.data.split("_")
+    requested = date.fromisoformat(value)
+    today = date.today()
+    if view == "day":
+        text, markup = render_slot_day(slot_store.version, requested)
+    else:
+        text, markup = render_slot_week(slot_store.version, today, max(requested, week_start(today)))
+    try:
+        bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    except telebot.apihelper.ApiTelegramException as e:
+        if 'message is not modified' not in str(e):
+            raise
+    bot.answer_callback_query(call.id)
+
+@text_router.route("🔔 Уведомления о местах")
+def toggle_place_notifications(message):
+    if subscribers.remove(message.chat.id):
+        bot.send_message(message.chat.id, "🔕 Вы отписались от уведомлений о свободных местах")
+    else:
+        subscribers.add(message.chat.id)
+        bot.send_message(message.chat.id, "🔔 Пришлём новое расписание, как только мастер его обновит. Нажмите ещё раз, чтобы отписаться")
     client_menu(message)
 
-@bot.message_handler(func=lambda message:message.text == "✍️ Записаться на ресницы")
+def free_slot_markup(now, days=14, limit=12):
+    """Кнопки ближайших свободных окон для записи; None — окон нет"""
+    buttons = []
+    for day, slots in slot_store.between(now.date(), now.date() + timedelta(days=days - 1)).items():
+        for slot in slots:
+            if slot['booked'] or datetime.combine(day, datetime.strptime(slot['time'], "%H:%M").time()) <= now:
+                continue
+            buttons.append(types.InlineKeyboardButton(
+                f"{day_label(day)} {slot['time']}", callback_data=f"book_{day.isoformat()}_{slot['time']}"))
+    if not buttons:
+        return None
+    markup = types.InlineKeyboardMarkup(row_width=3)
+    markup.add(*buttons[:limit])
+    return markup
+
+@text_router.route("✍️ Записаться на ресницы")
 def sign_up(message):
-    bot.send_message(message.chat.id, f"Держите контакты мастера, для записи☺️:{MASTER_CONTACT}")
+    markup = free_slot_markup(datetime.now())
+    if markup is None:
+        bot.send_message(message.chat.id, f"Держите контакты мастера, для записи☺️:{MASTER_CONTACT}")
+    else:
+        reminded = " и ".join(format_hours(hours) for hours in sorted(REMINDER_OFFSETS_HOURS, reverse=True))
+        bot.send_message(
+            message.chat.id,
+            f"Держите контакты мастера, для записи☺️:{MASTER_CONTACT}\n\n"
+            f"Или выберите свободное окно — напомним за {reminded} до визита:",
+            reply_markup=markup
+        )
     client_menu(message)
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith("book_"))
+def book_slot(call):
+    _, value, start = call.data.split("_")
+    day = date.fromisoformat(value)
+    visit = datetime.combine(day, datetime.strptime(start, "%H:%M").time())
+    if visit <= datetime.now() or not slot_store.book(day, start):
+        bot.answer_callback_query(call.id, "😔 Это окно уже занято, выберите другое", show_alert=True)
+        markup = free_slot_markup(datetime.now())
+        if markup is not None:
+            bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=markup)
+        return
+    
+    label = f"{day_label(day)} в {start}"
+    reminders.add(appointment_id(day, start), call.message.chat.id, visit.timestamp(), label)
+    bot.edit_message_text(
+        f"✅ Вы записаны на {label}\n"
+        f"Контакты мастера: {MASTER_CONTACT}",
+        call.message.chat.id,
+        call.message.message_id
+    )
+    bot.answer_callback_query(call.id)
+
 
 
-@bot.message_handler(func=lambda message: message.text == "⭐️ Оставить отзыв")
+@text_router.route("⭐️ Оставить отзыв")
 def request_review(message):
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn1 = types.KeyboardButton("🏠 Отмена")
-    markup.add(btn1)
-    
-    # Создаем инлайн-клавиатуру для оценки
-    rating_markup = types.InlineKeyboardMarkup(row_width=5)
-    ratings = []
-    for i in range(1, 6):
-        ratings.append(types.InlineKeyboardButton("⭐" * i, callback_data=f"rating_{i}"))
-    rating_markup.add(*ratings)
-    
     bot.send_message(
         message.chat.id, 
         "📝 Оцените работу мастера от 1 до 5 звезд:",
-        reply_markup=markup
+        reply_markup=CANCEL_KEYBOARD
     )
-    bot.send_message(message.chat.id, "Выберите оценку:", reply_markup=rating_markup)
+    bot.send_message(message.chat.id, "Выберите оценку:", reply_markup=RATING_KEYBOARD)
 
-@bot.message_handler(func=lambda message:message.text == "🏠 Отмена")
+@text_router.route("🏠 Отмена")
 def back_client_menu(message):
     client_menu(message)
 
@@ -554,17 +1476,27 @@ def process_rating(call):
         call.message.chat.id,
         call.message.message_id
     )
-    
-    msg = bot.send_message(call.message.chat.id, "💬 Ваш отзыв:")
-    bot.register_next_step_handler(msg, process_review_with_rating)
+    # Приглашение уже в отредактированном сообщении, ответ ждём в том же чате
+    bot.register_next_step_handler(call.message, process_review_with_rating)
 
+@track_handler
 def process_review_with_rating(message):
     user_id = message.from_user.id
-    if user_id not in user_data or 'rating' not in user_data[user_id]:
+    pending = user_data.get(user_id)
+    if not pending or 'rating' not in pending:
         client_menu(message)
         return
     
-    rating = user_data[user_id]['rating']
+    rating = pending['rating']
+    
+    # Тот же отзыв, отправленный повторно, не сохраняем
+    _, recent = review_store.find(
+        {'author': user_id, 'since': time.time() - REVIEW_DEDUP_HOURS * 3600}, 0, 5)
+    if near_duplicate(message.text, [review for _, review in recent], REVIEW_DEDUP_SIMILARITY):
+        user_data.pop(user_id)
+        bot.send_message(message.chat.id, "ℹ️ Такой отзыв от вас уже есть, спасибо!", reply_markup=REMOVE_KEYBOARD)
+        client_menu(message)
+        return
     
     review = {
         'user_id': user_id,
@@ -576,21 +1508,115 @@ def process_review_with_rating(message):
     }
     
 
-    reviews_list.append(review)
-    save_reviews(reviews_list)
+    review_store.append(review)
     
     # Очищаем временные данные
-    if user_id in user_data:
-        del user_data[user_id]
+    user_data.pop(user_id)
     
     bot.send_message(
         message.chat.id, 
         f"✅ Спасибо за ваш отзыв ({rating}⭐)! Он очень важен для нас!",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=REMOVE_KEYBOARD
     )
     client_menu(message)
 
+# ==================== МЕТРИКИ ОБРАБОТЧИКОВ ====================
+# Замеряем только точки входа из telebot, внутренние вызовы меню не считаются
+text_router.wrap_handlers(track_handler)
+for _handler in bot.message_handlers + bot.callback_query_handlers:
+    if _handler['function'] != text_router.dispatch:
+        _handler['function'] = track_handler(_handler['function'])
+
 # ==================== ЗАПУСК ПРИЛОЖЕНИЯ ====================
+def warm_media_cache():
+    """Проверить записи file_id заранее, чтобы первый ответ не считал хэш фото"""
+    for path in (WELCOME_PHOTO, PRICE_PHOTO, PLACE_PHOTO):
+        if os.path.exists(path):
+            media_cache.get(path)
+
+def warm_slot_calendar():
+    """Построить календарь текущей недели, который первым запросят клиенты"""
+    today = date.today()
+    render_slot_week(slot_store.version, today, week_start(today))
+    render_slot_schedule(slot_store.version, today)
+
+WARM_UP_STEPS = [
+    ("загрузка отзывов", lambda: review_store.resolve()),
+    ("соединение с Telegram", lambda: bot.get_me()),
+    ("медиа-кэш", warm_media_cache),
+    ("календарь окон", warm_slot_calendar),
+]
+
+boot.record("инициализация модуля", boot.started)
+
+def create_dirs():
+    """Папки с данными бота; до этого момента модуль ничего не пишет на диск"""
+    with boot.phase("папки"):
+        required_dirs = [PRICE_DIR, REVIEWS_DIR, BACKUP_DIR, FLASH_DIR, RECORDS_DIR, CACHE_DIR, STATE_DIR, PROFILE_DIR]
+        for dir_path in required_dirs:
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+                print(f"📁 Создана папка: {dir_path}")
+
+def open_storage():
+    """Открыть базу и хранилища, которые нужны с первого апдейта"""
+    if database is not None:
+        # Схема создаётся при первом соединении
+        with boot.phase("база SQLite"):
+            database.resolve()
+    with boot.phase("хранилища"):
+        for store in (user_data, next_steps, media_cache, slot_store, subscribers, reminders):
+            if isinstance(store, Lazy):
+                store.resolve()
+
+def start_services(leader=True):
+    """Хранилища и фоновые задачи; задачи в одном экземпляре запускает только ведущий процесс"""
+    open_storage()
+    
+    # Профиль первых секунд работы, если он заказан переменной окружения
+    if PROFILE_SECONDS > 0:
+        profiler.start(min(PROFILE_SECONDS, PROFILE_MAX_SECONDS))
+    
+    # Периодически сохраняем незавершённые диалоги, чтобы пережить редеплой
+    user_data.start_snapshots(STATE_SNAPSHOT_INTERVAL)
+    next_steps.start_snapshots(STATE_SNAPSHOT_INTERVAL)
+    
+    if not leader:
+        return
+    
+    # Сжатые снимки отзывов и удаление старых копий
+    review_snapshots.start()
+    
+    # Прошедшие дни из расписания больше не нужны
+    slot_store.prune(date.today())
+    
+    # Досылаем рассылку, прерванную перезапуском
+    place_broadcaster.resume()
+    
+    # Таймер напоминаний; пропущенные за время простоя уйдут сразу, по одному разу
+    reminders.start()
+
+def prepare_wsgi_worker():
+    """Подготовка воркера gunicorn (см. src/wsgi.py): Flask-приложение обслуживает сервер"""
+    print(f"🚀 Запуск воркера WSGI (pid {os.getpid()}), хранилище: {STORAGE_BACKEND}")
+    if not validate_environment_variables():
+        raise RuntimeError("Не заданы обязательные переменные окружения")
+    if database is None:
+        print("⚠️ Несколько воркеров с STORAGE_BACKEND=files не делят отзывы, диалоги, окна и записи, нужен sqlite")
+    if not WEBHOOK_URL:
+        print("⚠️ WEBHOOK_URL не установлен: в режиме WSGI апдейты приходят только через webhook")
+    
+    create_dirs()
+    leader = acquire_leadership(os.path.join(STATE_DIR, "leader.lock"))
+    start_services(leader)
+    
+    # setWebhook вызывается, только если адрес отличается, поэтому воркеры не мешают друг другу
+    with boot.phase("настройка webhook"):
+        if WEBHOOK_URL:
+            setup_webhook()
+    update_dispatcher.start()
+    boot.warm_up(WARM_UP_STEPS)
+
 def run_bot():
     """Запуск бота в зависимости от среды"""
     print("🚀 Запуск бота...")
@@ -602,19 +1628,26 @@ def run_bot():
         print("❌ Не могу запустить бота без обязательных переменных")
         return
     
-    # Создаем необходимые директории
-    required_dirs = [PRICE_DIR, REVIEWS_DIR, FLASH_DIR, RECORDS_DIR]
-    for dir_path in required_dirs:
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
-            print(f"📁 Создана папка: {dir_path}")
+    create_dirs()
+    start_services()
     
     # Запускаем в зависимости от среды
-    if WEBHOOK_URL and setup_webhook():
+    with boot.phase("настройка webhook"):
+        webhook_ready = bool(WEBHOOK_URL) and setup_webhook()
+    
+    # Тяжёлая загрузка идёт в фоне; /health отвечает 503, пока она не закончится
+    boot.warm_up(WARM_UP_STEPS)
+    if webhook_ready:
         print("🌐 Запуск в режиме WEBHOOK")
+        update_dispatcher.start()
         app.run(host='0.0.0.0', port=PORT, debug=False)
     else:
         print("🔄 Запуск в режиме POLLING")
+        # Апдейты приходят через getUpdates, а /health и /metrics для Railway отдаёт тот же Flask app
+        threading.Thread(
+            target=lambda: app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False),
+            name='http', daemon=True
+        ).start()
         start_polling()
 
 if __name__ == '__main__':
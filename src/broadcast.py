@@ -0,0 +1,238 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import file_id, read_json, write_json
+
+
+class SubscriberRegistry:
+    """Чаты, которые подписались на уведомления. Хранится на диске и
+    перечитывается, если файл изменил другой процесс; для нескольких
+    воркеров WSGI есть SqliteSubscriberRegistry"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_id = file_id(path)
+        self._chats = set(read_json(path, []))
+
+    def _refresh(self):
+        current = file_id(self.path)
+        if current != self._file_id:
+            self._file_id = current
+            self._chats = set(read_json(self.path, []))
+
+    def _write(self):
+        write_json(self.path, sorted(self._chats))
+        self._file_id = file_id(self.path)
+
+    def add(self, chat_id):
+        with self._lock:
+            self._refresh()
+            if chat_id in self._chats:
+                return False
+            self._chats.add(chat_id)
+            self._write()
+            return True
+
+    def remove(self, chat_id):
+        with self._lock:
+            self._refresh()
+            if chat_id not in self._chats:
+                return False
+            self._chats.discard(chat_id)
+            self._write()
+            return True
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            self._refresh()
+            return chat_id in self._chats
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._chats)
+
+    def chat_ids(self):
+        with self._lock:
+            self._refresh()
+            return sorted(self._chats)
+
+
+class Broadcaster:
+    """Рассылка подписчикам через пул потоков.
+
+    deliver(chat_id, payload) отправляет сообщение и возвращает False, если
+    чат недоступен (бот заблокирован) — такой чат исключается из подписчиков.
+    Исключение считается временной ошибкой (сеть, 5xx, исчерпанные повторы
+    429): чат остаётся в очереди и получает ещё попытку через retry_delay
+    секунд, всего не больше max_attempts. Частоту ограничивает общий SendScheduler, пул лишь держит несколько
+    запросов в полёте. Очередь получателей сохраняется в job_file и после
+    перезапуска рассылка продолжается с того же места. Новая рассылка
+    заменяет незавершённую: подписчикам нужна только последняя версия.
+    """
+
+    def __init__(self, deliver, subscribers, job_file, workers=8, save_interval=2.0,
+                 max_attempts=3, retry_delay=30.0):
+        self.deliver = deliver
+        self.subscribers = subscribers
+        self.job_file = job_file
+        self.workers = workers
+        self.save_interval = save_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._job = None
+        self._thread = None
+
+    def start(self, payload):
+        """Запустить рассылку всем подписчикам; вернуть число получателей"""
+        job = {
+            'id': time.time_ns(),
+            'payload': payload,
+            'pending': self.subscribers.chat_ids(),
+            'sent': 0,
+            'dropped': 0,
+            'failed': 0,
+            'attempts': {},   # str(chat_id) -> неудачных попыток
+            'done': set()
+        }
+        with self._lock:
+            self._job = job
+            self._save(job)
+        self._ensure_thread()
+        self._wakeup.set()
+        return len(job['pending'])
+
+    def resume(self):
+        """Продолжить рассылку, прерванную перезапуском"""
+        job = read_json(self.job_file, None)
+        if not job or not job.get('pending'):
+            return 0
+        job['done'] = set()
+        job.setdefault('attempts', {})
+        with self._lock:
+            self._job = job
+        print(f"📣 Продолжаем рассылку: осталось {len(job['pending'])} чатов")
+        self._ensure_thread()
+        self._wakeup.set()
+        return len(job['pending'])
+
+    def pending(self):
+        job = self._job
+        return len(job['pending']) - len(job['done']) if job else 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='broadcast', daemon=True)
+                self._thread.start()
+
+    def _save(self, job):
+        pending = [chat_id for chat_id in job['pending'] if chat_id not in job['done']]
+        if pending:
+            state = {key: value for key, value in job.items() if key != 'done'}
+            write_json(self.job_file, dict(state, pending=pending))
+        else:
+            try:
+                os.remove(self.job_file)
+            except FileNotFoundError:
+                pass
+
+    def _loop(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='broadcast') as pool:
+            while True:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                job = self._job
+                if job and len(job['pending']) > len(job['done']):
+                    try:
+                        self._run(job, pool)
+                    except Exception as e:
+                        print(f"❌ Ошибка рассылки: {e}")
+
+    def _send_one(self, job, chat_id):
+        try:
+            if self.deliver(chat_id, job['payload']) is False:
+                self.subscribers.remove(chat_id)
+                return 'dropped'
+            return 'sent'
+        except Exception as e:
+            print(f"⚠️ Рассылка в чат {chat_id} не удалась: {e}")
+            return 'retry'
+
+    def _finish(self, job, chat_id, outcome):
+        with self._lock:
+            if outcome == 'retry':
+                attempts = job['attempts'][str(chat_id)] = job['attempts'].get(str(chat_id), 0) + 1
+                if attempts < self.max_attempts:
+                    return   # чат остаётся в очереди до следующего круга
+                outcome = 'failed'
+            job[outcome] += 1
+            job['done'].add(chat_id)
+
+    def _run(self, job, pool):
+        started = time.monotonic()
+        while True:
+            self._run_round(job, pool)
+            with self._lock:
+                if self._job is not job:
+                    print(f"📣 Рассылка прервана новой: доставлено {job['sent']}")
+                    return
+                self._save(job)
+                left = len(job['pending']) - len(job['done'])
+            if not left:
+                break
+            # Остались чаты с временными ошибками — новый круг после паузы;
+            # новая рассылка (start) будит поток раньше
+            print(f"📣 Повтор рассылки через {self.retry_delay:g} с: {left} чатов")
+            if self._wakeup.wait(self.retry_delay) and self._job is job:
+                self._wakeup.clear()
+            if self._job is not job:
+                return
+        print(f"📣 Рассылка завершена за {time.monotonic() - started:.1f} с: "
+              f"доставлено {job['sent']}, отписано {job['dropped']}, ошибок {job['failed']}")
+
+    def _run_round(self, job, pool):
+        # Первое сообщение отправляем отдельно: файл загрузится один раз,
+        # а остальные получатели пойдут уже по file_id
+        pending = [chat_id for chat_id in job['pending'] if chat_id not in job['done']]
+        self._finish(job, pending[0], self._send_one(job, pending[0]))
+
+        futures = {}
+        saved_at = time.monotonic()
+        for chat_id in pending[1:]:
+            if self._job is not job:
+                break   # появилась более новая рассылка
+            futures[pool.submit(self._send_one, job, chat_id)] = chat_id
+            # Не набираем очередь заранее: так прогресс сохраняется точно
+            while len(futures) >= self.workers * 2:
+                self._collect(job, futures)
+            if time.monotonic() - saved_at >= self.save_interval:
+                if self._superseded(job):
+                    break
+                with self._lock:
+                    if self._job is job:
+                        self._save(job)
+                saved_at = time.monotonic()
+        while futures:
+            self._collect(job, futures)
+
+    def _superseded(self, job):
+        """Новую рассылку мог начать другой процесс — тогда эта больше не нужна"""
+        current = read_json(self.job_file, None)
+        if current and current.get('id', 0) > job['id']:
+            with self._lock:
+                if self._job is job:
+                    self._job = None
+            return True
+        return self._job is not job
+
+    def _collect(self, job, futures):
+        future = next(iter(futures))
+        chat_id = futures.pop(future)
+        self._finish(job, chat_id, future.result())
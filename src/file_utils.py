@@ -0,0 +1,56 @@
+import os
+import json
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w', opener=open):
+    """with atomic_write(path) as f: ... — запись во временный файл рядом
+    и атомарная подмена path. При ошибке прежний файл остаётся как был"""
+    tmp_path = f"{path}.tmp"
+    kwargs = {} if 'b' in mode else {'encoding': 'utf-8'}
+    try:
+        with opener(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def report_corrupted(path, error, label=None):
+    print(f"⚠️ {label or f'Файл {path}'} повреждён, начинаем заново: {error}")
+
+
+def read_json(path, default=None, label=None):
+    """Содержимое JSON-файла или default, если файла нет или он повреждён.
+    default, отличный от None, задаёт ожидаемый тип: {} — объект, [] — список"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        report_corrupted(path, e, label)
+        return default
+    if default is not None and not isinstance(data, type(default)):
+        report_corrupted(path, f"ожидался {type(default).__name__}, а не {type(data).__name__}", label)
+        return default
+    return data
+
+
+def file_id(path):
+    """(inode, mtime) файла: меняется, когда файл подменяет любой процесс"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
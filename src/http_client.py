@@ -0,0 +1,33 @@
+import socket
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter с включённым TCP keep-alive для соединений пула"""
+
+    def __init__(self, keepalive=60, **kwargs):
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        options = list(HTTPConnection.default_socket_options)
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        # На Linux можно задать, через сколько секунд простоя слать проверки
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive))
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(self.keepalive // 4, 1)))
+        kwargs['socket_options'] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def build_session(pool_size=16, keepalive=60):
+    """Общая сессия requests с пулом постоянных соединений к Bot API"""
+    session = requests.Session()
+    adapter = KeepAliveAdapter(keepalive=keepalive, pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
@@ -0,0 +1,72 @@
+import json
+import threading
+
+from file_utils import atomic_write, read_json, report_corrupted
+
+
+class LongPoller:
+    """Получение апдейтов через getUpdates для режима без вебхука.
+
+    Пачка апдейтов сразу уходит в submit (UpdateDispatcher), так что чаты
+    обрабатываются параллельно, как и при вебхуке. Смещение подтверждённых
+    апдейтов сохраняется в файл: после перезапуска бот продолжает с того же
+    места, а не получает заново всё, что Telegram ещё хранит. Если очередь
+    переполнена, смещение не сдвигается и апдейт будет получен повторно.
+    При ошибках пауза растёт вдвое, от backoff_min до backoff_max секунд.
+    """
+
+    def __init__(self, fetch, submit, offset_file, allowed_updates=None,
+                 timeout=25, limit=100, backoff_min=1.0, backoff_max=60.0):
+        self._fetch = fetch
+        self._submit = submit
+        self.offset_file = offset_file
+        self.allowed_updates = allowed_updates
+        self.timeout = timeout
+        self.limit = limit
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self._stop = threading.Event()
+        self.offset = self._load_offset()
+
+    def _load_offset(self):
+        offset = read_json(self.offset_file, {}, "Файл смещения polling").get('offset')
+        if offset is not None and not isinstance(offset, int):
+            report_corrupted(self.offset_file, f"смещение {offset!r}", "Файл смещения polling")
+            return None
+        return offset
+
+    def _save_offset(self):
+        with atomic_write(self.offset_file) as f:
+            json.dump({'offset': self.offset}, f)
+
+    def poll_once(self):
+        """Один запрос getUpdates; True — все полученные апдейты приняты в очередь"""
+        updates = self._fetch(self.offset, self.limit, self.timeout, self.allowed_updates)
+        accepted = True
+        offset = self.offset
+        for update in updates:
+            if not self._submit(update):
+                # Очередь заполнена: этот и следующие апдейты Telegram отдаст снова
+                accepted = False
+                break
+            offset = update.update_id + 1
+        if offset != self.offset:
+            self.offset = offset
+            self._save_offset()
+        return accepted
+
+    def run(self):
+        """Цикл опроса до вызова stop()"""
+        delay = self.backoff_min
+        while not self._stop.is_set():
+            try:
+                if not self.poll_once():
+                    self._stop.wait(self.backoff_min)
+                delay = self.backoff_min
+            except Exception as e:
+                print(f"❌ Ошибка polling: {e}, повтор через {delay:g} с")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    def stop(self):
+        self._stop.set()
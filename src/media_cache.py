@@ -0,0 +1,92 @@
+import os
+import hashlib
+import threading
+
+from file_utils import read_json, write_json
+
+
+class MediaCache:
+    """Кэш file_id для фото, которые бот отправляет из локальных файлов.
+
+    После первой отправки Telegram возвращает file_id, и повторно загружать
+    тот же файл не нужно. Запись привязана к пути, размеру, mtime и хэшу
+    содержимого, а индекс хранится на диске и переживает перезапуск.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        return read_json(self.index_file, {}, "Индекс медиа-кэша")
+
+    def _save(self):
+        write_json(self.index_file, self._entries)
+
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(path)
+
+    # Хранение записей; SqliteMediaCache переопределяет эти три метода
+    def _entry(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+
+    def _drop(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def get(self, path):
+        """Вернуть file_id, если файл не менялся с момента отправки"""
+        key = self._key(path)
+        entry = self._entry(key)
+        if not entry:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['file_id']
+
+        # mtime изменился — сверяем содержимое, прежде чем выбрасывать запись
+        if entry['size'] == stat.st_size and self._file_hash(path) == entry['sha256']:
+            entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+            self._store(key, entry)
+            return entry['file_id']
+
+        self.invalidate(path)
+        return None
+
+    def put(self, path, file_id):
+        """Запомнить file_id, полученный после загрузки файла"""
+        stat = os.stat(path)
+        entry = {
+            'file_id': file_id,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': self._file_hash(path)
+        }
+        self._store(self._key(path), entry)
+
+    def invalidate(self, path):
+        """Сбросить запись для файла (например, после его замены)"""
+        self._drop(self._key(path))
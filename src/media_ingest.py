@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow фото сохраняется как есть
+    Image = None
+
+
+CHUNK_SIZE = 64 * 1024
+# Права нового файла, если прежнего не было (mkstemp создаёт файл с 0600)
+DEFAULT_MODE = 0o644
+
+
+def _temp_path(dest_path, suffix):
+    # Временный файл в той же папке, чтобы os.replace был атомарным
+    fd, path = tempfile.mkstemp(prefix='.ingest-', suffix=suffix, dir=os.path.dirname(dest_path) or '.')
+    os.close(fd)
+    return path
+
+
+def _target_mode(dest_path):
+    """Права, которые должны остаться у dest_path после подмены"""
+    try:
+        return os.stat(dest_path).st_mode & 0o777
+    except FileNotFoundError:
+        return DEFAULT_MODE
+
+
+def stream_to_file(session, url, path, timeout=None):
+    """Скачать файл по частям, не держа его целиком в памяти"""
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def optimize_jpeg(src_path, dst_path, max_side=1280, quality=85):
+    """Пережать фото в JPEG с ограничением сторон. False — оставить исходник"""
+    if Image is None:
+        return False
+    try:
+        with Image.open(src_path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.thumbnail((max_side, max_side))
+            image.save(dst_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+        with open(dst_path, 'rb') as f:
+            os.fsync(f.fileno())
+    except Exception as e:
+        print(f"⚠️ Не удалось оптимизировать фото, сохраняем как есть: {e}")
+        return False
+    return os.path.getsize(dst_path) < os.path.getsize(src_path)
+
+
+def ingest_photo(session, url, dest_path, timeout=None, max_side=1280, quality=85):
+    """Скачать фото, пережать и атомарно подменить dest_path.
+
+    Старый файл остаётся на месте до последнего шага, поэтому читатели
+    всегда видят либо прежнее фото, либо новое целиком.
+    """
+    raw_path = _temp_path(dest_path, '.raw')
+    optimized_path = _temp_path(dest_path, '.jpg')
+    try:
+        stream_to_file(session, url, raw_path, timeout=timeout)
+        path = optimized_path
+        if not optimize_jpeg(raw_path, optimized_path, max_side=max_side, quality=quality):
+            path = raw_path
+        # os.replace переносит права временного файла, а не прежнего фото
+        os.chmod(path, _target_mode(dest_path))
+        os.replace(path, dest_path)
+    finally:
+        for path in (raw_path, optimized_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,129 @@
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+
+class OutboxError(Exception):
+    """Отложенное сообщение не отправлено: Bot API ответил ошибкой"""
+
+    def __init__(self, chat_id, status_code, text):
+        super().__init__(f"чат {chat_id}: {status_code} {text[:200]}")
+        self.chat_id = chat_id
+        self.status_code = status_code
+
+
+class _DeferredResponse:
+    """Ответ на отложенный sendMessage: telebot получает сообщение-заглушку"""
+
+    status_code = 200
+
+    def __init__(self, result):
+        self._payload = {'ok': True, 'result': result}
+
+    def json(self):
+        return self._payload
+
+    @property
+    def text(self):
+        return json.dumps(self._payload, ensure_ascii=False)
+
+
+def _is_inline(markup):
+    return markup is not None and 'inline_keyboard' in str(markup)
+
+
+class Outbox:
+    """Склейка приглашения «Выберите действие» с предыдущим ответом.
+
+    Встраивается в цепочку apihelper.CUSTOM_REQUEST_SENDER. Внутри collect()
+    последний sendMessage задерживается до следующего запроса: если следом
+    идёт сообщение, которое нужно только ради клавиатуры (filler_texts),
+    клавиатура переходит к задержанному сообщению, а само оно не
+    отправляется. Любой другой запрос сначала отправляет задержанное
+    сообщение, поэтому порядок в чате не меняется, а остальные тексты
+    уходят по отдельности, как их написал обработчик. Ошибка отправки
+    задержанного сообщения поднимается из следующего запроса или из
+    выхода collect() — её видит обработчик исключений апдейта. Вне
+    collect() (фоновые потоки, рассылка) запросы проходят как есть.
+    """
+
+    def __init__(self, send, filler_texts=()):
+        self._send = send
+        self.filler_texts = set(filler_texts)
+        self._local = threading.local()
+
+    @contextmanager
+    def collect(self):
+        """with outbox.collect(): обработать апдейт — сообщения уйдут одной пачкой"""
+        if getattr(self._local, 'pending', None) is not None:
+            # Уже внутри буфера (вложенный вызов) — сбросит внешний collect()
+            yield
+            return
+        self._local.pending = []
+        try:
+            yield
+        except BaseException:
+            # Ошибка обработчика важнее: задержанное сообщение всё равно пробуем отправить
+            pending, self._local.pending = self._local.pending, None
+            try:
+                self._flush(pending)
+            except Exception as e:
+                print(f"❌ Отложенное сообщение не отправлено: {e}")
+            raise
+        pending, self._local.pending = self._local.pending, None
+        self._flush(pending)
+
+    def request(self, method, url, params=None, files=None, **kwargs):
+        """Отправитель запросов для apihelper.CUSTOM_REQUEST_SENDER"""
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            return self._send(method, url, params=params, files=files, **kwargs)
+
+        if url.rsplit('/', 1)[-1] == 'sendMessage' and not files and params and 'chat_id' in params:
+            entry = (method, url, dict(params), kwargs)
+            if pending and self._merge(pending[-1], entry):
+                return _DeferredResponse(self._placeholder(params))
+            # Задерживаем только последнее сообщение: ему может достаться клавиатура меню
+            self._local.pending = [entry]
+            self._flush(pending)
+            return _DeferredResponse(self._placeholder(params))
+
+        # Другой запрос: сначала отправляем накопленное, иначе сообщения придут не по порядку
+        self._local.pending = []
+        self._flush(pending)
+        return self._send(method, url, params=params, files=files, **kwargs)
+
+    def _merge(self, previous, entry):
+        """Отдать previous клавиатуру приглашения entry; другие тексты не склеиваются"""
+        first, second = previous[2], entry[2]
+        if second['text'] not in self.filler_texts or first['chat_id'] != second['chat_id']:
+            return False
+        first_markup, second_markup = first.get('reply_markup'), second.get('reply_markup')
+        if first_markup is not None and second_markup is not None and (
+                _is_inline(first_markup) or _is_inline(second_markup)):
+            # У сообщения одна клавиатура: встроенную и обычную не совместить
+            return False
+        if second_markup is not None:
+            first['reply_markup'] = second_markup
+        return True
+
+    @staticmethod
+    def _placeholder(params):
+        chat_id = params['chat_id']
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        return {
+            'message_id': 0,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', '')
+        }
+
+    def _flush(self, pending):
+        for method, url, params, kwargs in pending:
+            response = self._send(method, url, params=params, **kwargs)
+            if response.status_code != 200:
+                raise OutboxError(params['chat_id'], response.status_code, response.text)
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import hmac
+import hashlib
+import secrets
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from file_utils import atomic_write
+
+
+# Поля с личными данными: в журнал медленных апдейтов попадают звёздочки
+PERSONAL_FIELDS = {'first_name', 'last_name', 'username', 'title', 'phone_number', 'email', 'bio', 'language_code'}
+# Объекты, чей id заменяется стабильным хэшем: один чат остаётся одним чатом
+ID_OBJECTS = {'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat'}
+
+_local = threading.local()
+_busy = {}            # ident потока -> True, пока он обрабатывает апдейт
+_busy_lock = threading.Lock()
+
+
+def note_handler(name):
+    """Запомнить обработчик, который вызван для текущего апдейта"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace['handlers'].append(name)
+
+
+def note_api(seconds, cpu_seconds=0.0):
+    """Учесть время запроса к Bot API в текущем апдейте.
+
+    cpu_seconds — процессорное время самого запроса (кодирование, TLS), чтобы
+    не посчитать его дважды: и в API, и в CPU.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace['api'] += seconds
+        trace['api_cpu'] += cpu_seconds
+        trace['api_calls'] += 1
+
+
+def traced(func):
+    """Декоратор: имя обработчика попадает в трассировку апдейта"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        note_handler(func.__name__)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _hash_id(value, id_key):
+    # HMAC с секретным ключом: без ключа id не подобрать перебором
+    return int(hmac.new(id_key, str(value).encode(), hashlib.sha256).hexdigest()[:12], 16)
+
+
+def redact(data, id_key, keep_text=lambda text: False, parent=None):
+    """Копия апдейта без личных данных.
+
+    Имена и контакты заменяются звёздочками, id пользователей и чатов —
+    HMAC от id с ключом id_key, произвольный текст — строкой той же длины.
+    Тексты кнопок и команды (keep_text) остаются, чтобы апдейт можно было
+    воспроизвести.
+    """
+    if isinstance(data, list):
+        return [redact(item, id_key, keep_text, parent) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        if key in PERSONAL_FIELDS and isinstance(value, str):
+            result[key] = '***'
+        elif key == 'id' and parent in ID_OBJECTS and isinstance(value, int):
+            result[key] = _hash_id(value, id_key)
+        elif key in ('text', 'caption') and isinstance(value, str):
+            result[key] = value if keep_text(value) else 'x' * len(value)
+        elif key in ('entities', 'caption_entities'):
+            result[key] = value
+        else:
+            result[key] = redact(value, id_key, keep_text, key)
+    return result
+
+
+def update_payload(update):
+    """Исходный JSON апдейта (или сообщения) из объектов telebot"""
+    if not hasattr(update, 'update_id'):
+        return {'message': getattr(update, 'json', None)}
+    payload = {'update_id': update.update_id}
+    for field in ('message', 'edited_message', 'callback_query'):
+        source = getattr(update, field, None)
+        if source is not None:
+            payload[field] = getattr(source, 'json', None)
+    return payload
+
+
+class SlowUpdateLog:
+    """Трассировка обработки апдейтов и журнал медленных.
+
+    Апдейт, обработанный дольше threshold секунд, пишется строкой JSON:
+    вызванные обработчики, время в запросах к Bot API, процессорное время
+    потока и остаток — ожидание диска, блокировок и лимитов отправки, —
+    плюс копия апдейта без личных данных. Журнал ротируется по max_bytes.
+    id_key — ключ HMAC для id; без него берётся случайный, и хэши одного
+    чата совпадают только в пределах процесса.
+    """
+
+    def __init__(self, path, threshold, keep_text=lambda text: False, max_bytes=5 * 1024 * 1024, id_key=None):
+        self.path = path
+        self.threshold = threshold
+        self.keep_text = keep_text
+        self._id_key = id_key or secrets.token_bytes(32)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, update, kind='update'):
+        if getattr(_local, 'trace', None) is not None:
+            # Вложенная обработка учитывается во внешней трассировке
+            yield
+            return
+        _local.trace = {'handlers': [], 'api': 0.0, 'api_cpu': 0.0, 'api_calls': 0}
+        ident = threading.get_ident()
+        with _busy_lock:
+            _busy[ident] = True
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            trace, _local.trace = _local.trace, None
+            with _busy_lock:
+                _busy.pop(ident, None)
+            if self.threshold and wall >= self.threshold:
+                self._record(update, kind, trace, wall, cpu)
+
+    def _record(self, update, kind, trace, wall, cpu):
+        api = trace['api']
+        cpu = max(cpu - trace['api_cpu'], 0)
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'kind': kind,
+            'update_id': getattr(update, 'update_id', None),
+            'handlers': trace['handlers'],
+            'duration_ms': round(wall * 1000, 1),
+            'breakdown_ms': {
+                'api': round(api * 1000, 1),
+                'cpu': round(cpu * 1000, 1),
+                'io_wait': round(max(wall - api - cpu, 0) * 1000, 1)
+            },
+            'api_calls': trace['api_calls'],
+            'update': redact(update_payload(update), self._id_key, self.keep_text)
+        }
+        handlers = ', '.join(trace['handlers']) or 'без обработчика'
+        print(f"🐢 Медленный апдейт {entry['update_id']} ({handlers}): {entry['duration_ms']:.0f} мс, "
+              f"API {entry['breakdown_ms']['api']:.0f} / CPU {entry['breakdown_ms']['cpu']:.0f} / "
+              f"ожидание {entry['breakdown_ms']['io_wait']:.0f}")
+        try:
+            with self._lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"❌ Не удалось записать медленный апдейт: {e}")
+
+
+class SamplingProfiler:
+    """Выборочный профилировщик обработки апдейтов.
+
+    Раз в interval секунд снимает стеки потоков, которые сейчас внутри
+    SlowUpdateLog.trace, и по окончании окна пишет их в формате collapsed
+    stacks («f1;f2;f3 число»), который понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, directory, interval=0.005):
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = None   # путь файла текущего окна
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, duration):
+        """Начать окно профилирования; None — уже идёт другое"""
+        with self._lock:
+            if self._running is not None:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.folded")
+            self._running = path
+        threading.Thread(target=self._run, args=(duration, path), name='profiler', daemon=True).start()
+        print(f"🔬 Профилирование на {duration:g} с, результат: {path}")
+        return path
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self, duration, path):
+        samples = Counter()
+        taken = 0
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline:
+                with _busy_lock:
+                    busy = set(_busy)
+                if busy:
+                    for ident, frame in sys._current_frames().items():
+                        if ident in busy:
+                            samples[self._stack(frame)] += 1
+                    taken += 1
+                time.sleep(self.interval)
+
+            with atomic_write(path) as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            print(f"🔬 Профиль готов: {path} ({taken} снимков, {len(samples)} стеков)")
+        except Exception as e:
+            print(f"❌ Ошибка профилирования: {e}")
+        finally:
+            with self._lock:
+                self._running = None
@@ -0,0 +1,125 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+
+# Методы Bot API, которые Telegram ограничивает по частоте
+THROTTLED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self, now):
+        """Занять токен; вернуть, сколько секунд ждать до его появления"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def try_take(self, now):
+        """Взять токен, только если он есть прямо сейчас"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class SendScheduler:
+    """Центральный ограничитель исходящих запросов к Bot API.
+
+    Перед каждой отправкой берёт токен из общей корзины и из корзины чата.
+    На ответ 429 выдерживает retry_after из ответа Telegram и повторяет
+    запрос с небольшим случайным разбросом.
+    """
+
+    def __init__(self, send, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3, max_chats=10000):
+        self._send = send
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = OrderedDict()   # chat_id -> TokenBucket, давно молчащие вытесняются
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def acquire(self, chat_id=None):
+        """Дождаться разрешения на отправку в чат"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._global.reserve(now)
+            if chat_id is not None:
+                wait = max(wait, self._chat_bucket(chat_id).reserve(now))
+        if wait > 0:
+            time.sleep(wait)
+
+    def _block(self, chat_id, retry_after):
+        with self._lock:
+            until = time.monotonic() + retry_after
+            bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+            bucket.blocked_until = max(bucket.blocked_until, until)
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.json()['parameters']['retry_after'])
+        except Exception:
+            return 1.0
+
+    @staticmethod
+    def _rewind(files):
+        # Файлы уже прочитаны при первой попытке — возвращаемся в начало
+        for value in (files or {}).values():
+            stream = value[1] if isinstance(value, tuple) else value
+            if hasattr(stream, 'seek'):
+                stream.seek(0)
+
+    def request(self, method, url, params=None, files=None, **kwargs):
+        """Отправитель запросов для apihelper.CUSTOM_REQUEST_SENDER"""
+        api_method = url.rsplit('/', 1)[-1]
+        throttled = api_method.startswith(THROTTLED_PREFIXES)
+        chat_id = params.get('chat_id') if throttled and params else None
+        if chat_id is not None:
+            chat_id = str(chat_id)
+
+        attempt = 0
+        while True:
+            if throttled:
+                self.acquire(chat_id)
+            response = self._send(method, url, params=params, files=files, **kwargs)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+
+            attempt += 1
+            retry_after = self._retry_after(response)
+            print(f"⏳ 429 от Telegram на {api_method}, повтор через {retry_after:.0f} с (попытка {attempt})")
+            self._block(chat_id, retry_after)
+            self._rewind(files)
+            jitter = random.uniform(0, 0.5 * attempt)
+            if throttled:
+                # retry_after выдержит acquire() через blocked_until корзины
+                time.sleep(jitter)
+            else:
+                # answerCallbackQuery, getFile, getUpdates идут мимо корзин — ждём здесь
+                time.sleep(retry_after + jitter)
@@ -0,0 +1,195 @@
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import file_id, read_json, write_json
+
+
+class ReminderScheduler:
+    """Напоминания клиентам о записи.
+
+    Запись — чат, время визита и подпись; напоминания уходят за каждое из
+    offsets (секунды) до визита. Все сроки лежат в одной куче (heapq), один
+    поток спит до ближайшего и будит пул отправки пачкой. Записи хранятся
+    в файле, каждое отправленное напоминание отмечается в нём до отправки,
+    поэтому после перезапуска оно не повторяется. Пропущенные за время
+    простоя напоминания уходят с опозданием, но один раз и только самое
+    близкое к визиту. Файл, изменённый другим процессом, перечитывается не
+    реже чем раз в poll_interval секунд, но файл пишется целиком, и запись
+    из двух процессов одновременно теряет одно из изменений: несколько
+    воркеров WSGI работают с SqliteReminderScheduler.
+    """
+
+    def __init__(self, send, path, offsets, workers=4, batch_size=50, poll_interval=30.0, retry_delay=60.0):
+        self.send = send
+        self.path = path
+        self.offsets = sorted(offsets, reverse=True)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+
+        self._lock = threading.Condition()
+        self._appointments = {}   # id -> {'chat_id', 'at', 'label', 'sent': [смещения]}
+        self._heap = []           # (срок, id, смещение)
+        self._file_id = None
+        self._thread = None
+        self._stop = False
+        self._load()
+
+    # ---------- файл ----------
+    def _load(self):
+        self._file_id = file_id(self.path)
+        self._appointments = read_json(self.path, {}, "Файл напоминаний").get('appointments', {})
+        self._rebuild()
+
+    def _save(self, changed=(), added=()):
+        """Записать изменения: added — новые записи, changed — изменённые или
+        удалённые. Файл переписывается целиком, id нужны хранилищам, которые
+        пишут записи по одной (SqliteReminderScheduler)"""
+        write_json(self.path, {'appointments': self._appointments})
+        self._file_id = file_id(self.path)
+
+    def _refresh(self):
+        if file_id(self.path) != self._file_id:
+            self._load()
+
+    def _rebuild(self):
+        self._heap = []
+        for appointment_id, appointment in self._appointments.items():
+            self._schedule(appointment_id, appointment)
+
+    def _schedule(self, appointment_id, appointment):
+        for offset in self.offsets:
+            if offset not in appointment['sent']:
+                heapq.heappush(self._heap, (appointment['at'] - offset, appointment_id, offset))
+
+    # ---------- записи ----------
+    def add(self, appointment_id, chat_id, at, label):
+        """Записать визит (at — timestamp); запись с тем же id заменяется"""
+        with self._lock:
+            self._refresh()
+            now = time.time()
+            # Напоминания, срок которых прошёл ещё до записи, не нужны
+            sent = [offset for offset in self.offsets if at - offset <= now]
+            appointment = {'chat_id': chat_id, 'at': at, 'label': label, 'sent': sent}
+            self._appointments[appointment_id] = appointment
+            self._schedule(appointment_id, appointment)
+            self._save(added=[appointment_id])
+            self._lock.notify()
+
+    def cancel(self, appointment_id):
+        """Отменить запись; False — её нет. Сроки в куче пропустятся при выборке"""
+        with self._lock:
+            self._refresh()
+            if self._appointments.pop(appointment_id, None) is None:
+                return False
+            self._save(changed=[appointment_id])
+            return True
+
+    def get(self, appointment_id):
+        with self._lock:
+            self._refresh()
+            appointment = self._appointments.get(appointment_id)
+            return dict(appointment) if appointment else None
+
+    def appointments(self):
+        """Все записи: {id: запись}"""
+        with self._lock:
+            self._refresh()
+            return {key: dict(appointment) for key, appointment in self._appointments.items()}
+
+    def pending(self):
+        """Сколько напоминаний ещё предстоит отправить"""
+        with self._lock:
+            self._refresh()
+            return sum(len(self.offsets) - len(a['sent']) for a in self._appointments.values())
+
+    # ---------- отправка ----------
+    def _take_due(self, now):
+        """Снять с кучи наступившие напоминания (не больше batch_size).
+
+        Возвращает (пачка на отправку, id изменённых записей).
+        """
+        batch = []
+        changed = set()
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            _, appointment_id, offset = heapq.heappop(self._heap)
+            appointment = self._appointments.get(appointment_id)
+            if appointment is None or offset in appointment['sent']:
+                continue
+            # Визит начался (или оба срока прошли за время простоя) — старые напоминания не шлём
+            later = [other for other in self.offsets if other < offset and appointment['at'] - other <= now]
+            appointment['sent'].append(offset)
+            changed.add(appointment_id)
+            if appointment['at'] <= now or later:
+                continue
+            batch.append((appointment_id, offset, appointment))
+        # Прошедшие визиты больше не нужны
+        for appointment_id in [key for key, a in self._appointments.items() if a['at'] <= now]:
+            del self._appointments[appointment_id]
+            changed.add(appointment_id)
+        return batch, changed
+
+    def _deliver(self, item):
+        appointment_id, offset, appointment = item
+        try:
+            self.send(appointment['chat_id'], appointment['label'], appointment['at'], offset)
+            return None
+        except Exception as e:
+            print(f"❌ Напоминание {appointment_id} не отправлено: {e}")
+            return item
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reminder') as pool:
+            while True:
+                with self._lock:
+                    if self._stop:
+                        return
+                    self._refresh()
+                    now = time.time()
+                    batch, changed = self._take_due(now)
+                    if changed:
+                        # Отметка «отправлено» попадает на диск раньше отправки
+                        self._save(changed)
+                    if not batch:
+                        timeout = self.poll_interval
+                        if self._heap:
+                            timeout = min(timeout, max(self._heap[0][0] - now, 0))
+                        self._lock.wait(timeout)
+                        continue
+
+                failed = [item for item in pool.map(self._deliver, batch) if item is not None]
+                if failed:
+                    self._retry(failed)
+                print(f"⏰ Отправлено напоминаний: {len(batch) - len(failed)}")
+
+    def _retry(self, failed):
+        """Ошибку сети повторяем позже, если визит ещё не начался"""
+        with self._lock:
+            changed = set()
+            for appointment_id, offset, _ in failed:
+                appointment = self._appointments.get(appointment_id)
+                if appointment is None or offset not in appointment['sent']:
+                    continue
+                appointment['sent'].remove(offset)
+                changed.add(appointment_id)
+                heapq.heappush(self._heap, (time.time() + self.retry_delay, appointment_id, offset))
+            if changed:
+                self._save(changed)
+
+    def start(self):
+        """Запустить поток таймера (в одном процессе — ведущем)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            print(f"⏰ Напоминания: ожидает {self.pending()}")
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop = True
+            self._lock.notify()
@@ -0,0 +1,59 @@
+import os
+import csv
+import gzip
+import json
+
+
+# Колонки CSV в том порядке, в каком их удобно читать в таблице
+CSV_FIELDS = ['date', 'rating', 'user_name', 'user_id', 'text', 'timestamp']
+
+FORMATS = ('csv', 'jsonl')
+
+# С этих символов Excel и LibreOffice начинают формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_file_name(fmt, compress, moment):
+    """Имя файла для пользователя: reviews_2026-10-17.csv.gz"""
+    return f"reviews_{moment:%Y-%m-%d}.{fmt}" + ('.gz' if compress else '')
+
+
+def csv_safe(value):
+    """Текст, который таблица не примет за формулу: впереди ставится апостроф"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def write_export(reviews, path, fmt='csv', compress=False):
+    """Записать отзывы в файл по одному, не собирая их в память.
+
+    reviews — любой итератор (ReviewStore.stream()). CSV пишется с BOM,
+    чтобы Excel сразу открыл кириллицу, а ячейки, похожие на формулу,
+    экранируются (csv_safe). Возвращает число записанных отзывов.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+
+    encoding = 'utf-8-sig' if fmt == 'csv' else 'utf-8'
+    if compress:
+        f = gzip.open(path, 'wt', encoding=encoding, newline='')
+    else:
+        f = open(path, 'w', encoding=encoding, newline='')
+
+    count = 0
+    with f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for review in reviews:
+                writer.writerow({key: csv_safe(value) for key, value in review.items()})
+                count += 1
+        else:
+            for review in reviews:
+                f.write(json.dumps(review, ensure_ascii=False) + '\n')
+                count += 1
+        f.flush()
+        if not compress:
+            os.fsync(f.fileno())
+    return count
@@ -0,0 +1,190 @@
+import re
+import bisect
+import difflib
+import threading
+from datetime import datetime, timedelta
+
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре, «ё» приравнивается к «е»"""
+    return WORD_RE.findall(str(text or '').lower().replace('ё', 'е'))
+
+
+class ReviewIndex:
+    """Индексы для поиска отзывов без перебора всего списка.
+
+    Обратный индекс по словам текста и по имени автора (слово запроса
+    совпадает с началом слова отзыва, так что «ресниц» найдёт «ресницы»),
+    отсортированный индекс по времени, списки по оценке и по user_id.
+    Отзыв получает номер позиции и добавляется во все индексы сразу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._docs = []
+            self._words = {}          # слово -> позиции отзывов
+            self._vocabulary = []     # отсортированные слова для поиска по началу
+            self._authors = {}        # слово из имени автора -> позиции
+            self._author_vocabulary = []
+            self._by_user = {}        # user_id -> позиции
+            self._by_rating = {}      # оценка -> позиции
+            self._by_time = []        # (timestamp, позиция) по возрастанию
+
+    @staticmethod
+    def _post(postings, vocabulary, token, position):
+        ids = postings.get(token)
+        if ids is None:
+            ids = postings[token] = []
+            bisect.insort(vocabulary, token)
+        if not ids or ids[-1] != position:
+            ids.append(position)
+
+    def add(self, review):
+        with self._lock:
+            position = len(self._docs)
+            self._docs.append(review)
+            for token in tokenize(review.get('text')):
+                self._post(self._words, self._vocabulary, token, position)
+            for token in tokenize(review.get('user_name')):
+                self._post(self._authors, self._author_vocabulary, token, position)
+            if review.get('user_id') is not None:
+                self._by_user.setdefault(review['user_id'], []).append(position)
+            self._by_rating.setdefault(review.get('rating', 5), []).append(position)
+            bisect.insort(self._by_time, (review.get('timestamp') or 0, position))
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _prefix(postings, vocabulary, prefix):
+        found = set()
+        for index in range(bisect.bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[index]
+            if not token.startswith(prefix):
+                break
+            found.update(postings[token])
+        return found
+
+    def _matching(self, postings, vocabulary, words):
+        result = None
+        for word in words:
+            ids = self._prefix(postings, vocabulary, word)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def search(self, words=(), ratings=None, since=None, until=None, author=None):
+        """Позиции подходящих отзывов от новых к старым.
+
+        Перебирается только самый узкий из индексов, остальные условия
+        проверяются по полям найденных отзывов.
+        """
+        with self._lock:
+            docs = self._docs
+            candidates = None
+            if words:
+                candidates = self._matching(self._words, self._vocabulary, words)
+            if author is not None:
+                if isinstance(author, int):
+                    by_author = set(self._by_user.get(author, ()))
+                else:
+                    by_author = self._matching(self._authors, self._author_vocabulary, tokenize(author))
+                candidates = by_author if candidates is None else candidates & by_author
+
+            if candidates is None:
+                by_rating = None
+                if ratings:
+                    by_rating = [p for rating in ratings for p in self._by_rating.get(rating, ())]
+                by_time = None
+                if since is not None or until is not None:
+                    lo = 0 if since is None else bisect.bisect_left(self._by_time, (since, -1))
+                    hi = len(self._by_time) if until is None else bisect.bisect_left(self._by_time, (until, -1))
+                    by_time = self._by_time[lo:hi]
+                if by_rating is not None and (by_time is None or len(by_rating) <= len(by_time)):
+                    candidates = by_rating
+                elif by_time is not None:
+                    candidates = [position for _, position in by_time]
+                else:
+                    return list(range(len(docs) - 1, -1, -1))
+
+            found = []
+            for position in candidates:
+                review = docs[position]
+                if ratings and review.get('rating', 5) not in ratings:
+                    continue
+                timestamp = review.get('timestamp') or 0
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    continue
+                found.append(position)
+            found.sort(reverse=True)
+            return found
+
+    def query(self, filters, offset, limit):
+        """Страница результатов: (всего найдено, [(номер, отзыв)]).
+
+        Номер тот же, что в общем списке «от новых к старым».
+        """
+        positions = self.search(**filters)
+        with self._lock:
+            total_docs = len(self._docs)
+            page = [(total_docs - position, self._docs[position]) for position in positions[offset:offset + limit]]
+        return len(positions), page
+
+
+def near_duplicate(text, reviews, threshold=0.9):
+    """Похож ли текст на один из отзывов (сравниваются слова без регистра и знаков)"""
+    normalized = ' '.join(tokenize(text))
+    for review in reviews:
+        other = ' '.join(tokenize(review.get('text')))
+        if normalized == other:
+            return True
+        if difflib.SequenceMatcher(None, normalized, other).ratio() >= threshold:
+            return True
+    return False
+
+
+def _parse_day(text):
+    """ДД.ММ.ГГГГ или ДД.ММ (текущий год)"""
+    try:
+        return datetime.strptime(text, "%d.%m.%Y")
+    except ValueError:
+        return datetime.strptime(text, "%d.%m").replace(year=datetime.now().year)
+
+
+def parse_query(text):
+    """Разобрать запрос мастера в условия поиска.
+
+    слова            — искать в тексте отзыва
+    оценка:5, 4-5    — оценка или диапазон (также 5⭐)
+    с:01.09 по:30.09 — дата отзыва, границы включительно
+    @Имя или @12345  — автор по имени или user_id
+    """
+    filters = {'words': [], 'ratings': None, 'since': None, 'until': None, 'author': None}
+    for part in text.split():
+        lowered = part.lower()
+        if lowered.startswith('оценка:') or lowered.rstrip('⭐️').isdigit() and '⭐' in lowered:
+            value = lowered.split(':', 1)[-1].replace('⭐', '').replace('️', '')
+            low, _, high = value.partition('-')
+            # «5-1» — тот же диапазон, что и «1-5»
+            low, high = sorted((int(low), int(high or low)))
+            filters['ratings'] = set(range(low, high + 1))
+        elif lowered.startswith('с:'):
+            filters['since'] = _parse_day(part[2:]).timestamp()
+        elif lowered.startswith('по:'):
+            filters['until'] = (_parse_day(part[3:]) + timedelta(days=1)).timestamp()
+        elif part.startswith('@') and len(part) > 1:
+            author = part[1:]
+            filters['author'] = int(author) if author.isdigit() else author
+        else:
+            filters['words'].extend(tokenize(part))
+    return filters
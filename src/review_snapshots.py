@@ -0,0 +1,195 @@
+import os
+import gzip
+import json
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import atomic_write
+
+
+SNAPSHOT_PREFIX = "reviews_"
+FULL_SUFFIX = "_full.jsonl.gz"
+INCREMENTAL_SUFFIX = "_inc.jsonl.gz"
+# Старые бэкапы из confirm_delete_all_reviews — полные копии в JSON
+LEGACY_PREFIX = "reviews_backup_"
+
+
+class ReviewSnapshots:
+    """Сжатые снимки хранилища отзывов с ротацией.
+
+    Полный снимок — все отзывы, инкрементальный — только добавленные после
+    предыдущего снимка. Каждый full_every-й снимок делается полным. Снимки
+    старше retention_days удаляются, кроме тех, от которых зависят более
+    новые инкрементальные. Вся запись на диск идёт в отдельном потоке.
+    """
+
+    def __init__(self, store, directory, interval=6 * 3600, retention_days=30, full_every=24):
+        self.store = store
+        self.directory = directory
+        self.interval = interval
+        self.retention_days = retention_days
+        self.full_every = full_every
+
+        self._lock = threading.Lock()
+        self._checkpoint = None        # позиция хранилища на момент последнего снимка
+        self._since_full = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='review-snapshots')
+        self._stop = threading.Event()
+
+    # ---------- запись ----------
+    def _new_name(self, suffix):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return f"{SNAPSHOT_PREFIX}{stamp}{suffix}"
+
+    def _write(self, name, reviews):
+        path = os.path.join(self.directory, name)
+        with atomic_write(path, 'wt', opener=gzip.open) as f:
+            for review in reviews:
+                f.write(json.dumps(review, ensure_ascii=False) + '\n')
+        return path
+
+    def _take(self):
+        """Снять снимок, если с прошлого раза что-то изменилось"""
+        with self._lock:
+            if self.store.checkpoint() == self._checkpoint:
+                return None
+
+            added = None
+            if self._checkpoint is not None and self._since_full < self.full_every:
+                added = self.store.since(self._checkpoint)
+
+            if added is None:
+                checkpoint, reviews = self.store.export()
+                name = self._write(self._new_name(FULL_SUFFIX), reviews)
+                self._since_full = 0
+            else:
+                generation, position = self._checkpoint
+                checkpoint = (generation, position + len(added))
+                name = self._write(self._new_name(INCREMENTAL_SUFFIX), added)
+                self._since_full += 1
+            self._checkpoint = checkpoint
+            return name
+
+    def _take_and_prune(self):
+        try:
+            self._take()
+            self.enforce_retention()
+        except Exception as e:
+            print(f"❌ Ошибка снимка отзывов: {e}")
+
+    def snapshot_now(self):
+        """Запланировать снимок; вернуть Future с путём к файлу"""
+        return self._executor.submit(self._take)
+
+    def backup(self, reviews):
+        """Полная копия переданных отзывов (перед удалением). Возвращает имя файла сразу"""
+        name = self._new_name(FULL_SUFFIX)
+
+        def job():
+            with self._lock:
+                self._write(name, reviews)
+                # Следующий снимок после очистки обязан быть полным
+                self._checkpoint = None
+        self._executor.submit(job)
+        return name
+
+    # ---------- ротация ----------
+    def list_snapshots(self):
+        """Имена снимков от старых к новым"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        snapshots = [
+            name for name in names
+            if name.startswith(SNAPSHOT_PREFIX) and (
+                name.endswith(FULL_SUFFIX) or name.endswith(INCREMENTAL_SUFFIX)
+                or (name.startswith(LEGACY_PREFIX) and name.endswith('.json')))
+        ]
+        return sorted(snapshots, key=self._stamp)
+
+    @staticmethod
+    def _stamp(name):
+        """Время снимка из имени файла в виде сортируемой строки"""
+        if name.startswith(LEGACY_PREFIX):
+            try:
+                seconds = int(name[len(LEGACY_PREFIX):-len('.json')])
+            except ValueError:
+                seconds = 0
+            return datetime.fromtimestamp(seconds).strftime("%Y%m%d-%H%M%S-%f")
+        return name[len(SNAPSHOT_PREFIX):].split('_', 1)[0]
+
+    @staticmethod
+    def _is_incremental(name):
+        return name.endswith(INCREMENTAL_SUFFIX)
+
+    def enforce_retention(self):
+        """Удалить просроченные снимки, не разрывая цепочки инкрементальных"""
+        cutoff = time.time() - self.retention_days * 86400
+        need_base = False
+        removed = 0
+        for name in reversed(self.list_snapshots()):
+            path = os.path.join(self.directory, name)
+            try:
+                expired = os.path.getmtime(path) < cutoff
+            except FileNotFoundError:
+                continue
+            if not expired or need_base:
+                # Сохранённому инкрементальному снимку нужны все предыдущие до полного
+                need_base = self._is_incremental(name)
+                continue
+            os.remove(path)
+            removed += 1
+        if removed:
+            print(f"🧹 Удалено старых снимков отзывов: {removed}")
+        return removed
+
+    # ---------- восстановление ----------
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        if name.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def load(self, name):
+        """Собрать отзывы на момент снимка: полный + инкрементальные после него"""
+        names = self.list_snapshots()
+        if name not in names:
+            raise FileNotFoundError(name)
+        chain = []
+        for candidate in reversed(names[:names.index(name) + 1]):
+            chain.append(candidate)
+            if not self._is_incremental(candidate):
+                break
+        else:
+            raise ValueError(f"Для {name} не найден полный снимок")
+
+        reviews = []
+        for part in reversed(chain):
+            reviews.extend(self._read(part))
+        return reviews
+
+    def restore(self, name):
+        """Заменить отзывы содержимым снимка (в фоне); текущие сохраняются копией"""
+        def job():
+            reviews = self.load(name)
+            with self._lock:
+                self._write(self._new_name(FULL_SUFFIX), self.store.export()[1])
+                self.store.replace_all(reviews)
+                self._checkpoint = None
+            return len(reviews)
+        return self._executor.submit(job)
+
+    # ---------- фоновый цикл ----------
+    def start(self):
+        """Периодические снимки и ротация в фоновом потоке"""
+        def loop():
+            while not self._stop.wait(self.interval):
+                self._executor.submit(self._take_and_prune)
+
+        threading.Thread(target=loop, name='review-snapshot-timer', daemon=True).start()
+        self._executor.submit(self.enforce_retention)
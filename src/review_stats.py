@@ -0,0 +1,73 @@
+import threading
+from datetime import datetime
+
+
+class RatingAggregates:
+    """Сводка по оценкам, обновляемая за O(1) на каждый новый отзыв.
+
+    Хранит количество, сумму, гистограмму 1–5 и скользящие корзины
+    по неделям и месяцам для просмотра динамики рейтинга.
+    """
+
+    def __init__(self, weeks_to_keep=12, months_to_keep=12):
+        self.weeks_to_keep = weeks_to_keep
+        self.months_to_keep = months_to_keep
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Обнулить сводку (после удаления всех отзывов)"""
+        with self._lock:
+            self.total = 0
+            self.rating_sum = 0
+            self.histogram = {rating: 0 for rating in range(1, 6)}
+            self.weekly = {}    # '2026-W07' -> [количество, сумма]
+            self.monthly = {}   # '2026-02'  -> [количество, сумма]
+
+    def add(self, review):
+        """Учесть новый отзыв"""
+        rating = review.get('rating', 5)
+        timestamp = review.get('timestamp')
+        with self._lock:
+            self.total += 1
+            self.rating_sum += rating
+            self.histogram[rating] = self.histogram.get(rating, 0) + 1
+            if timestamp:
+                moment = datetime.fromtimestamp(timestamp)
+                year, week, _ = moment.isocalendar()
+                self._add_to_bucket(self.weekly, f"{year}-W{week:02d}", rating, self.weeks_to_keep)
+                self._add_to_bucket(self.monthly, moment.strftime("%Y-%m"), rating, self.months_to_keep)
+
+    @staticmethod
+    def _add_to_bucket(buckets, key, rating, keep):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= keep:
+                oldest = min(buckets)
+                if key < oldest:
+                    return
+                del buckets[oldest]
+            bucket = buckets[key] = [0, 0]
+        bucket[0] += 1
+        bucket[1] += rating
+
+    @property
+    def average(self):
+        return self.rating_sum / self.total if self.total else 0.0
+
+    @staticmethod
+    def _trend(buckets, limit):
+        return [
+            (key, count, total / count)
+            for key, (count, total) in sorted(buckets.items())[-limit:]
+        ]
+
+    def weekly_trend(self, limit=4):
+        """Последние недели: (неделя, количество, средняя оценка)"""
+        with self._lock:
+            return self._trend(self.weekly, limit)
+
+    def monthly_trend(self, limit=3):
+        """Последние месяцы: (месяц, количество, средняя оценка)"""
+        with self._lock:
+            return self._trend(self.monthly, limit)
@@ -0,0 +1,249 @@
+import os
+import json
+import atexit
+import threading
+
+from review_stats import RatingAggregates
+from review_search import ReviewIndex
+
+
+# Служебная запись журнала: всё, что было до неё, удалено
+CLEAR_MARKER = {'_op': 'clear'}
+
+
+class ReviewStore:
+    """Хранилище отзывов в виде журнала JSON Lines (одна строка — один отзыв).
+
+    Новые отзывы дописываются в конец файла, fsync выполняется фоновым потоком
+    раз в flush_interval секунд. Удаление пишет маркер очистки, а фоновое
+    сжатие переписывает журнал во временный файл и атомарно подменяет его.
+    Сводка по оценкам (stats) и поисковые индексы обновляются вместе с
+    каждой записью.
+    """
+
+    def __init__(self, log_file, legacy_file=None, flush_interval=1.0):
+        self.log_file = log_file
+        self.legacy_file = legacy_file
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._reviews = []
+        self._by_rating = {}     # оценка -> позиции отзывов в self._reviews
+        self._garbage = 0        # строк журнала, которые уберёт сжатие
+        self._generation = 0     # увеличивается при каждой очистке
+        self._dirty = False
+        self.stats = RatingAggregates()
+        self.search_index = ReviewIndex()
+
+        if legacy_file and os.path.exists(legacy_file) and not os.path.exists(log_file):
+            self._migrate_legacy()
+        self._load()
+        for position, review in enumerate(self._reviews):
+            self._index(position, review)
+        if self._garbage:
+            # Оборванную строку нельзя оставлять в конце: следующая запись склеится с ней
+            self._write_atomically(self._reviews)
+            self._garbage = 0
+
+        self._fh = open(self.log_file, 'a', encoding='utf-8')
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='review-store-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # ---------- загрузка ----------
+    def _migrate_legacy(self):
+        """Однократный перенос отзывов из старого reviews.json"""
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                reviews = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Не удалось прочитать {self.legacy_file}: {e}")
+            return
+
+        self._write_atomically(reviews)
+        os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+        print(f"📦 Перенесено {len(reviews)} отзывов из {self.legacy_file}")
+
+    def _load(self):
+        try:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная запись после падения процесса
+                        self._garbage += 1
+                        continue
+                    if record == CLEAR_MARKER:
+                        self._garbage += len(self._reviews) + 1
+                        self._reviews.clear()
+                    else:
+                        self._reviews.append(record)
+        except FileNotFoundError:
+            pass
+
+    def _index(self, position, review):
+        self._by_rating.setdefault(review.get('rating', 5), []).append(position)
+        self.stats.add(review)
+        self.search_index.add(review)
+
+    # ---------- запись ----------
+    def append(self, review):
+        """Добавить отзыв: одна строка в журнал, fsync — в фоне"""
+        line = json.dumps(review, ensure_ascii=False)
+        with self._lock:
+            self._fh.write(line + '\n')
+            self._reviews.append(review)
+            self._index(len(self._reviews) - 1, review)
+            self._dirty = True
+
+    def clear(self):
+        """Удалить все отзывы"""
+        with self._lock:
+            self._fh.write(json.dumps(CLEAR_MARKER) + '\n')
+            self._garbage += len(self._reviews) + 1
+            self._reviews.clear()
+            self._by_rating.clear()
+            self.stats.reset()
+            self.search_index.reset()
+            self._generation += 1
+            self._dirty = True
+
+    def replace_all(self, reviews):
+        """Заменить все отзывы (восстановление из резервной копии)"""
+        with self._lock:
+            self.clear()
+            for review in reviews:
+                self.append(review)
+
+    def flush(self):
+        """Сбросить буфер журнала на диск"""
+        with self._lock:
+            if not self._dirty or self._fh.closed:
+                return
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._dirty = False
+
+    def _write_atomically(self, reviews):
+        tmp_file = f"{self.log_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for review in reviews:
+                f.write(json.dumps(review, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.log_file)
+
+    def compact(self):
+        """Переписать журнал без удалённых и битых записей"""
+        with self._lock:
+            if not self._garbage:
+                return
+            generation = self._generation
+            snapshot = list(self._reviews)
+
+        # Основная часть пишется без блокировки, чтобы не задерживать append
+        tmp_file = f"{self.log_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for review in snapshot:
+                f.write(json.dumps(review, ensure_ascii=False) + '\n')
+
+        with self._lock:
+            if generation != self._generation:
+                # Пока писали, отзывы снова очистили — повторим в следующий раз
+                os.remove(tmp_file)
+                return
+            with open(tmp_file, 'a', encoding='utf-8') as f:
+                for review in self._reviews[len(snapshot):]:
+                    f.write(json.dumps(review, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._fh.close()
+            os.replace(tmp_file, self.log_file)
+            self._fh = open(self.log_file, 'a', encoding='utf-8')
+            self._garbage = 0
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                self.compact()
+            except Exception as e:
+                print(f"❌ Ошибка записи журнала отзывов: {e}")
+
+    def close(self):
+        """Остановить фоновый поток и дописать всё на диск"""
+        self._stop.set()
+        with self._lock:
+            if self._fh.closed:
+                return
+            self.flush()
+            self._fh.close()
+
+    # ---------- чтение ----------
+    def __len__(self):
+        return len(self._reviews)
+
+    def __iter__(self):
+        return iter(self._reviews)
+
+    def stream(self, chunk_size=500):
+        """Отзывы от старых к новым порциями, без копии всего списка.
+
+        Если во время обхода отзывы очистили, обход заканчивается.
+        """
+        with self._lock:
+            generation, total = self._generation, len(self._reviews)
+        for start in range(0, total, chunk_size):
+            with self._lock:
+                if generation != self._generation:
+                    return
+                chunk = self._reviews[start:min(start + chunk_size, total)]
+            yield from chunk
+
+    def checkpoint(self):
+        """Текущая позиция хранилища: (номер очистки, количество отзывов)"""
+        with self._lock:
+            return self._generation, len(self._reviews)
+
+    def export(self):
+        """Копия всех отзывов вместе с checkpoint, которому она соответствует"""
+        with self._lock:
+            return (self._generation, len(self._reviews)), list(self._reviews)
+
+    def since(self, checkpoint):
+        """Отзывы, добавленные после checkpoint; None — если с тех пор была очистка"""
+        generation, position = checkpoint
+        with self._lock:
+            if generation != self._generation or position > len(self._reviews):
+                return None
+            return self._reviews[position:]
+
+    def count(self, rating=None):
+        """Количество отзывов, при необходимости — только с заданной оценкой"""
+        if rating is None:
+            return len(self._reviews)
+        return len(self._by_rating.get(rating, ()))
+
+    def newest(self, offset, limit, rating=None):
+        """Страница отзывов от новых к старым: список пар (номер, отзыв).
+
+        Берутся только нужные позиции, весь список не копируется и не разворачивается.
+        """
+        with self._lock:
+            positions = None if rating is None else self._by_rating.get(rating, [])
+            total = len(self._reviews) if positions is None else len(positions)
+            page = []
+            for number in range(offset + 1, min(offset + limit, total) + 1):
+                index = total - number
+                position = index if positions is None else positions[index]
+                page.append((number, self._reviews[position]))
+            return page
+
+    def find(self, filters, offset, limit):
+        """Поиск по индексам: (всего найдено, [(номер, отзыв)]), см. review_search.parse_query"""
+        return self.search_index.query(filters, offset, limit)
@@ -0,0 +1,40 @@
+class TextRouter:
+    """Таблица маршрутов «текст кнопки -> обработчик».
+
+    Вместо десятков lambda-предикатов telebot проверяет один обработчик,
+    а нужная функция находится поиском в словаре за O(1).
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def route(self, *texts):
+        """Декоратор: зарегистрировать обработчик для точных текстов кнопок"""
+        def decorator(handler):
+            for text in texts:
+                if text in self._routes:
+                    raise ValueError(f"Маршрут уже занят: {text}")
+                self._routes[text] = handler
+            return handler
+        return decorator
+
+    def __contains__(self, text):
+        return text in self._routes
+
+    def matches(self, message):
+        return message.text in self._routes
+
+    def dispatch(self, message):
+        self._routes[message.text](message)
+
+    def attach(self, bot):
+        """Подключить таблицу к боту одним обработчиком текстовых сообщений"""
+        bot.register_message_handler(self.dispatch, content_types=['text'], func=self.matches)
+
+    def wrap_handlers(self, decorator):
+        """Обернуть все зарегистрированные обработчики (например, для метрик)"""
+        wrapped = {}
+        for text, handler in self._routes.items():
+            if handler not in wrapped:
+                wrapped[handler] = decorator(handler)
+            self._routes[text] = wrapped[handler]
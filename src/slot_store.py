@@ -0,0 +1,178 @@
+import bisect
+import threading
+from datetime import date, datetime, timedelta
+
+from file_utils import file_id, read_json, write_json
+
+
+class SlotStore:
+    """Свободные окна мастера с индексом по дате.
+
+    Окно — дата, время начала, длительность в минутах и признак занятости.
+    Окна сгруппированы по датам (внутри дня — по времени), список дат
+    отсортирован, поэтому выборка дня или недели не перебирает все окна.
+    Каждое изменение увеличивает version и атомарно сохраняет файл. Если
+    файл подменил другой процесс, он перечитывается при следующем обращении,
+    но одновременные изменения из двух процессов не согласуются: несколько
+    воркеров WSGI работают с SqliteSlotStore.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_date = {}   # 'YYYY-MM-DD' -> окна дня по возрастанию времени
+        self._dates = []     # отсортированные ключи _by_date
+        self._version = 0
+        self._file_id = None  # (inode, mtime) прочитанного файла
+        self._load()
+
+    def _refresh(self):
+        """Перечитать файл, если его изменил другой процесс"""
+        current = file_id(self.path)
+        if current == self._file_id:
+            return
+        with self._lock:
+            if current == self._file_id:
+                return
+            self._by_date.clear()
+            self._dates.clear()
+            self._load()
+            self._version += 1
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
+
+    def _load(self):
+        self._file_id = file_id(self.path)
+        for slot in read_json(self.path, {}, "Файл окон").get('slots', []):
+            self._insert(slot)
+
+    def _save(self):
+        slots = [slot for day in self._dates for slot in self._by_date[day]]
+        write_json(self.path, {'slots': slots})
+        self._file_id = file_id(self.path)
+        self._version += 1
+
+    def _insert(self, slot):
+        day = self._by_date.get(slot['date'])
+        if day is None:
+            day = self._by_date[slot['date']] = []
+            bisect.insort(self._dates, slot['date'])
+        times = [existing['time'] for existing in day]
+        if slot['time'] in times:
+            return False
+        day.insert(bisect.bisect(times, slot['time']), slot)
+        return True
+
+    def _find(self, day, start):
+        for slot in self._by_date.get(day.isoformat(), []):
+            if slot['time'] == start:
+                return slot
+        return None
+
+    def add(self, day, start, duration):
+        """Добавить свободное окно; False — на это время окно уже есть"""
+        self._refresh()
+        validate_slot(day, start, duration)
+        slot = {'date': day.isoformat(), 'time': start, 'duration': int(duration), 'booked': False}
+        with self._lock:
+            if not self._insert(slot):
+                return False
+            self._save()
+            return True
+
+    def remove(self, day, start):
+        """Удалить окно; False — такого окна нет"""
+        self._refresh()
+        key = day.isoformat()
+        with self._lock:
+            slot = self._find(day, start)
+            if slot is None:
+                return False
+            self._by_date[key].remove(slot)
+            if not self._by_date[key]:
+                del self._by_date[key]
+                self._dates.remove(key)
+            self._save()
+            return True
+
+    def set_booked(self, day, start, booked):
+        """Отметить окно занятым или свободным; False — такого окна нет"""
+        self._refresh()
+        with self._lock:
+            slot = self._find(day, start)
+            if slot is None:
+                return False
+            if slot['booked'] != booked:
+                slot['booked'] = booked
+                self._save()
+            return True
+
+    def book(self, day, start):
+        """Занять свободное окно; False — окна нет или его уже заняли"""
+        self._refresh()
+        with self._lock:
+            slot = self._find(day, start)
+            if slot is None or slot['booked']:
+                return False
+            slot['booked'] = True
+            self._save()
+            return True
+
+    def day(self, day):
+        """Окна одного дня"""
+        self._refresh()
+        with self._lock:
+            return [dict(slot) for slot in self._by_date.get(day.isoformat(), [])]
+
+    def between(self, first, last):
+        """Окна с first по last включительно: {дата: [окна]} только для дней с окнами"""
+        self._refresh()
+        with self._lock:
+            lo = bisect.bisect_left(self._dates, first.isoformat())
+            hi = bisect.bisect_right(self._dates, last.isoformat())
+            return {
+                date.fromisoformat(key): [dict(slot) for slot in self._by_date[key]]
+                for key in self._dates[lo:hi]
+            }
+
+    def next_free_date(self, after):
+        """Ближайший день после after, где есть свободное окно"""
+        self._refresh()
+        with self._lock:
+            for key in self._dates[bisect.bisect_right(self._dates, after.isoformat()):]:
+                if any(not slot['booked'] for slot in self._by_date[key]):
+                    return date.fromisoformat(key)
+        return None
+
+    def prune(self, before):
+        """Удалить окна за прошедшие дни; вернуть сколько удалено"""
+        self._refresh()
+        with self._lock:
+            cut = bisect.bisect_left(self._dates, before.isoformat())
+            if not cut:
+                return 0
+            removed = sum(len(self._by_date.pop(key)) for key in self._dates[:cut])
+            del self._dates[:cut]
+            self._save()
+            return removed
+
+    def __len__(self):
+        self._refresh()
+        with self._lock:
+            return sum(len(day) for day in self._by_date.values())
+
+
+def validate_slot(day, start, duration):
+    if not isinstance(day, date):
+        raise ValueError("дата должна быть datetime.date")
+    datetime.strptime(start, "%H:%M")
+    if duration <= 0:
+        raise ValueError("длительность должна быть положительной")
+
+
+def week_start(day):
+    """Понедельник недели, в которую попадает day"""
+    return day - timedelta(days=day.weekday())
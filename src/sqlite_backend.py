@@ -0,0 +1,683 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import threading
+from datetime import date
+
+from media_cache import MediaCache
+from reminders import ReminderScheduler
+from slot_store import validate_slot
+from review_stats import RatingAggregates
+from review_search import ReviewIndex
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rating INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_by_rating ON reviews (rating, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    entry TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    booked INTEGER NOT NULL,
+    PRIMARY KEY (date, time)
+);
+CREATE TABLE IF NOT EXISTS chats (
+    list TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    PRIMARY KEY (list, chat_id)
+);
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    label TEXT NOT NULL,
+    sent TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS updates (
+    update_id INTEGER PRIMARY KEY,
+    chat_key TEXT NOT NULL,
+    owner INTEGER NOT NULL,
+    claimed REAL NOT NULL,
+    done INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS updates_by_chat ON updates (chat_key, done, update_id);
+"""
+
+
+class Database:
+    """Общая база SQLite в режиме WAL для нескольких процессов.
+
+    У каждого потока своё соединение: sqlite3 не разрешает делить их между
+    потоками, а в WAL читатели не мешают писателю. Записи идут в явных
+    транзакциях BEGIN IMMEDIATE, конкурирующие процессы ждут busy_timeout.
+    """
+
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def transaction(self):
+        """with db.transaction() as conn: ... — одна атомарная запись"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _meta(conn, key, default=0):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+class SqliteReviewStore:
+    """Отзывы в общей базе; интерфейс совпадает с ReviewStore.
+
+    Сводку stats и поисковые индексы каждый процесс ведёт у себя и досчитывает
+    по новым строкам (id больше последнего учтённого), а после очистки в любом
+    процессе — её номер хранится в meta — пересчитывает с нуля.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.RLock()
+        self._stats = RatingAggregates()
+        self._search_index = ReviewIndex()
+        self._generation = None
+        self._last_id = 0
+        self._count = 0
+
+    def _sync(self):
+        with self._lock:
+            conn = self.db.connection()
+            # Номер очистки и новые строки читаем из одного снимка базы
+            conn.execute("BEGIN")
+            try:
+                generation = _meta(conn, 'reviews_generation')
+                if generation != self._generation:
+                    self._stats.reset()
+                    self._search_index.reset()
+                    self._generation = generation
+                    self._last_id = 0
+                    self._count = 0
+                rows = conn.execute(
+                    "SELECT id, data FROM reviews WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+            finally:
+                conn.execute("COMMIT")
+            for review_id, data in rows:
+                review = json.loads(data)
+                self._stats.add(review)
+                self._search_index.add(review)
+                self._last_id = review_id
+                self._count += 1
+
+    @property
+    def stats(self):
+        self._sync()
+        return self._stats
+
+    # ---------- запись ----------
+    @staticmethod
+    def _insert(conn, review):
+        conn.execute("INSERT INTO reviews (rating, data) VALUES (?, ?)",
+                     (review.get('rating', 5), json.dumps(review, ensure_ascii=False)))
+
+    def append(self, review):
+        with self.db.transaction() as conn:
+            self._insert(conn, review)
+
+    def _clear(self, conn):
+        conn.execute("DELETE FROM reviews")
+        _set_meta(conn, 'reviews_generation', _meta(conn, 'reviews_generation') + 1)
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            self._clear(conn)
+
+    def replace_all(self, reviews):
+        with self.db.transaction() as conn:
+            self._clear(conn)
+            for review in reviews:
+                self._insert(conn, review)
+
+    def import_once(self, load):
+        """Перенести отзывы из файлов, если это ещё не сделал другой процесс.
+
+        load() вызывается только при переносе; возвращает список отзывов.
+        """
+        with self.db.transaction() as conn:
+            if _meta(conn, 'reviews_imported'):
+                return None
+            reviews = load()
+            for review in reviews:
+                self._insert(conn, review)
+            _set_meta(conn, 'reviews_imported', 1)
+            return len(reviews)
+
+    def flush(self):
+        """Каждая запись уже зафиксирована транзакцией"""
+
+    def compact(self):
+        """Место освобождает сама SQLite"""
+
+    def close(self):
+        """Соединения закрываются вместе с процессом"""
+
+    # ---------- чтение ----------
+    def __len__(self):
+        self._sync()
+        return self._count
+
+    def __iter__(self):
+        return self.stream()
+
+    def stream(self, chunk_size=500):
+        """Отзывы порциями по id: в памяти не больше chunk_size строк"""
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                "SELECT id, data FROM reviews WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            for review_id, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+    def checkpoint(self):
+        self._sync()
+        with self._lock:
+            return self._generation, self._count
+
+    def export(self):
+        conn = self.db.connection()
+        conn.execute("BEGIN")
+        try:
+            generation = _meta(conn, 'reviews_generation')
+            reviews = [json.loads(data) for data, in conn.execute("SELECT data FROM reviews ORDER BY id")]
+        finally:
+            conn.execute("COMMIT")
+        return (generation, len(reviews)), reviews
+
+    def since(self, checkpoint):
+        generation, position = checkpoint
+        conn = self.db.connection()
+        conn.execute("BEGIN")
+        try:
+            if generation != _meta(conn, 'reviews_generation'):
+                return None
+            rows = conn.execute(
+                "SELECT data FROM reviews ORDER BY id LIMIT -1 OFFSET ?", (position,)).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return [json.loads(data) for data, in rows]
+
+    def count(self, rating=None):
+        if rating is None:
+            return len(self)
+        return self.db.execute("SELECT COUNT(*) FROM reviews WHERE rating = ?", (rating,)).fetchone()[0]
+
+    def newest(self, offset, limit, rating=None):
+        if rating is None:
+            rows = self.db.execute(
+                "SELECT data FROM reviews ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+        else:
+            rows = self.db.execute(
+                "SELECT data FROM reviews WHERE rating = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (rating, limit, offset))
+        return [(offset + number, json.loads(data)) for number, (data,) in enumerate(rows, 1)]
+
+    def find(self, filters, offset, limit):
+        self._sync()
+        return self._search_index.query(filters, offset, limit)
+
+
+class SqliteStateStore:
+    """Состояние диалогов в общей базе; интерфейс совпадает с StateStore"""
+
+    # Как часто (раз в сколько записей) убирать просроченное и лишнее
+    PURGE_EVERY = 100
+
+    def __init__(self, db, namespace, max_size=10000, ttl=3600):
+        self.db = db
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self._writes = 0
+        self._stop = threading.Event()
+
+    def purge(self):
+        """Удалить просроченные записи и самые старые сверх max_size"""
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM state WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time()))
+            conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key IN ("
+                "SELECT key FROM state WHERE namespace = ? ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_size))
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at, updated) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, str(key), pickle.dumps(value), now + ttl if ttl else None, now))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def get(self, key, default=None):
+        row = self.db.execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self.namespace, str(key), time.time())).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def update(self, key, func, ttl=None):
+        """Атомарно заменить значение на func(текущее или None): одна транзакция
+        BEGIN IMMEDIATE, другие процессы ждут её конца"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (self.namespace, str(key), now)).fetchone()
+            value = func(pickle.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at, updated) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, str(key), pickle.dumps(value), now + ttl if ttl else None, now))
+        return value
+
+    def pop(self, key, default=None):
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?",
+                (self.namespace, str(key))).fetchone()
+            if row is None:
+                return default
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (self.namespace, str(key)))
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return default
+        return pickle.loads(value)
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self.namespace, time.time())).fetchone()[0]
+
+    def snapshot(self):
+        """Данные и так на диске"""
+
+    def start_snapshots(self, interval):
+        """Вместо снимков — периодическая уборка просроченных записей"""
+        if interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.purge()
+                except Exception as e:
+                    print(f"❌ Ошибка уборки состояния: {e}")
+
+        threading.Thread(target=loop, name='state-purge', daemon=True).start()
+
+
+class SqliteUpdateClaims:
+    """Порядок апдейтов одного чата и отсев дублей для всех воркеров.
+
+    UpdateDispatcher у каждого процесса свой, а Telegram раздаёт апдейты
+    одного чата по разным соединениям, то есть разным воркерам. Принятый
+    апдейт записывается в общую таблицу: повторная доставка в любой воркер
+    — дубль. Перед обработкой апдейт ждёт, пока закончатся более ранние
+    апдейты того же чата. Заявка, которую не закрыли за lease секунд
+    (воркер упал или завис), очередь чата больше не держит. Апдейты своего
+    процесса не ждём: их порядок уже держит UpdateDispatcher.
+    """
+
+    # Как часто (раз в сколько апдейтов) убирать старые заявки
+    PURGE_EVERY = 1000
+
+    def __init__(self, db, lease=30.0, poll_interval=0.02, keep=3600.0):
+        self.db = db
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.keep = keep
+        self._claims = 0
+
+    def claim(self, update_id, key):
+        """True — апдейт новый; False — его уже принял какой-то воркер"""
+        with self.db.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO updates (update_id, chat_key, owner, claimed, done) VALUES (?, ?, ?, ?, 0)",
+                (update_id, str(key), os.getpid(), time.time()))
+        self._claims += 1
+        if self._claims % self.PURGE_EVERY == 0:
+            self.purge()
+        return cursor.rowcount == 1
+
+    def wait_turn(self, update_id, key):
+        """Дождаться конца более ранних апдейтов чата, но не дольше lease"""
+        deadline = time.monotonic() + self.lease
+        while time.monotonic() < deadline:
+            first, = self.db.execute(
+                "SELECT MIN(update_id) FROM updates "
+                "WHERE chat_key = ? AND done = 0 AND owner != ? AND claimed > ?",
+                (str(key), os.getpid(), time.time() - self.lease)).fetchone()
+            if first is None or first >= update_id:
+                return
+            time.sleep(self.poll_interval)
+
+    def done(self, update_id):
+        """Апдейт обработан или отброшен: следующий апдейт чата может идти"""
+        with self.db.transaction() as conn:
+            conn.execute("UPDATE updates SET done = 1 WHERE update_id = ?", (update_id,))
+
+    def forget(self, update_id):
+        """Апдейт не принят (очередь полна): повторная доставка не считается дублем"""
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM updates WHERE update_id = ?", (update_id,))
+
+    def purge(self):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM updates WHERE claimed < ?", (time.time() - self.keep,))
+
+
+class SqliteMediaCache(MediaCache):
+    """Кэш file_id в общей базе: фото, загруженное одним процессом, видят все"""
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        row = self.db.execute("SELECT entry FROM media WHERE path = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, key, entry):
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO media (path, entry) VALUES (?, ?)", (key, json.dumps(entry)))
+
+    def _drop(self, key):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM media WHERE path = ?", (key,))
+
+
+class SqliteSlotStore:
+    """Окна для записи в общей базе; интерфейс совпадает с SlotStore.
+
+    Окно занимает один UPDATE ... WHERE booked = 0, поэтому два воркера не
+    запишут на одно время двоих. version — счётчик изменений в meta, общий для всех
+    процессов: по нему сбрасываются кэши отрисовки.
+    """
+
+    COLUMNS = "date, time, duration, booked"
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _slot(row):
+        day, start, duration, booked = row
+        return {'date': day, 'time': start, 'duration': duration, 'booked': bool(booked)}
+
+    @staticmethod
+    def _changed(conn):
+        _set_meta(conn, 'slots_version', _meta(conn, 'slots_version') + 1)
+
+    @staticmethod
+    def _insert(conn, slot):
+        return conn.execute(
+            f"INSERT OR IGNORE INTO slots ({SqliteSlotStore.COLUMNS}) VALUES (?, ?, ?, ?)",
+            (slot['date'], slot['time'], slot['duration'], int(slot['booked']))).rowcount == 1
+
+    @property
+    def version(self):
+        return _meta(self.db.connection(), 'slots_version')
+
+    def import_once(self, load):
+        """Перенести окна из slots.json, если это ещё не сделал другой процесс.
+
+        load() вызывается только при переносе; возвращает список окон.
+        """
+        with self.db.transaction() as conn:
+            if _meta(conn, 'slots_imported'):
+                return None
+            slots = load()
+            for slot in slots:
+                self._insert(conn, slot)
+            _set_meta(conn, 'slots_imported', 1)
+            self._changed(conn)
+            return len(slots)
+
+    # ---------- запись ----------
+    def add(self, day, start, duration):
+        validate_slot(day, start, duration)
+        slot = {'date': day.isoformat(), 'time': start, 'duration': int(duration), 'booked': False}
+        with self.db.transaction() as conn:
+            if not self._insert(conn, slot):
+                return False
+            self._changed(conn)
+            return True
+
+    def _update(self, sql, params):
+        with self.db.transaction() as conn:
+            if conn.execute(sql, params).rowcount == 0:
+                return False
+            self._changed(conn)
+            return True
+
+    def remove(self, day, start):
+        return self._update("DELETE FROM slots WHERE date = ? AND time = ?", (day.isoformat(), start))
+
+    def set_booked(self, day, start, booked):
+        return self._update(
+            "UPDATE slots SET booked = ? WHERE date = ? AND time = ?",
+            (int(booked), day.isoformat(), start))
+
+    def book(self, day, start):
+        return self._update(
+            "UPDATE slots SET booked = 1 WHERE date = ? AND time = ? AND booked = 0", (day.isoformat(), start))
+
+    def prune(self, before):
+        with self.db.transaction() as conn:
+            removed = conn.execute("DELETE FROM slots WHERE date < ?", (before.isoformat(),)).rowcount
+            if removed:
+                self._changed(conn)
+            return removed
+
+    # ---------- чтение ----------
+    def day(self, day):
+        rows = self.db.execute(
+            f"SELECT {self.COLUMNS} FROM slots WHERE date = ? ORDER BY time", (day.isoformat(),))
+        return [self._slot(row) for row in rows]
+
+    def between(self, first, last):
+        days = {}
+        rows = self.db.execute(
+            f"SELECT {self.COLUMNS} FROM slots WHERE date BETWEEN ? AND ? ORDER BY date, time",
+            (first.isoformat(), last.isoformat()))
+        for row in rows:
+            days.setdefault(date.fromisoformat(row[0]), []).append(self._slot(row))
+        return days
+
+    def next_free_date(self, after):
+        row = self.db.execute(
+            "SELECT MIN(date) FROM slots WHERE date > ? AND booked = 0", (after.isoformat(),)).fetchone()
+        return date.fromisoformat(row[0]) if row[0] else None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+
+
+class SqliteSubscriberRegistry:
+    """Список чатов (подписчики) в общей базе; интерфейс
+    совпадает с SubscriberRegistry. name отделяет списки друг от друга"""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def import_once(self, load):
+        """Перенести чаты из JSON-файла, если это ещё не сделал другой процесс"""
+        with self.db.transaction() as conn:
+            if _meta(conn, f'chats_{self.name}_imported'):
+                return None
+            chat_ids = load()
+            conn.executemany("INSERT OR IGNORE INTO chats (list, chat_id) VALUES (?, ?)",
+                             [(self.name, chat_id) for chat_id in chat_ids])
+            _set_meta(conn, f'chats_{self.name}_imported', 1)
+            return len(chat_ids)
+
+    def add(self, chat_id):
+        with self.db.transaction() as conn:
+            return conn.execute("INSERT OR IGNORE INTO chats (list, chat_id) VALUES (?, ?)",
+                                (self.name, chat_id)).rowcount == 1
+
+    def remove(self, chat_id):
+        with self.db.transaction() as conn:
+            return conn.execute("DELETE FROM chats WHERE list = ? AND chat_id = ?",
+                                (self.name, chat_id)).rowcount == 1
+
+    def __contains__(self, chat_id):
+        return self.db.execute("SELECT 1 FROM chats WHERE list = ? AND chat_id = ?",
+                               (self.name, chat_id)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM chats WHERE list = ?", (self.name,)).fetchone()[0]
+
+    def chat_ids(self):
+        return [chat_id for chat_id, in self.db.execute(
+            "SELECT chat_id FROM chats WHERE list = ? ORDER BY chat_id", (self.name,))]
+
+
+class SqliteReminderScheduler(ReminderScheduler):
+    """Напоминания с записями в общей базе.
+
+    Записи и отметки об отправке пишутся построчно, а не снимком всех записей,
+    поэтому запись из одного воркера не затирает отметки ведущего, который
+    рассылает напоминания, и наоборот. Отметка «отправлено» только обновляет
+    существующую строку и не возвращает запись, отменённую в другом воркере.
+    Номер изменения лежит в meta: по нему процесс понимает, что пора
+    перечитать записи.
+    """
+
+    def __init__(self, db, send, offsets, **kwargs):
+        self.db = db
+        self._version = None
+        super().__init__(send, None, offsets, **kwargs)
+
+    def _load(self):
+        conn = self.db.connection()
+        # Номер изменения и записи читаем из одного снимка базы
+        conn.execute("BEGIN")
+        try:
+            self._version = _meta(conn, 'reminders_version')
+            rows = conn.execute("SELECT id, chat_id, at, label, sent FROM reminders").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        self._appointments = {
+            appointment_id: {'chat_id': chat_id, 'at': at, 'label': label, 'sent': json.loads(sent)}
+            for appointment_id, chat_id, at, label, sent in rows
+        }
+        self._rebuild()
+
+    def _refresh(self):
+        if _meta(self.db.connection(), 'reminders_version') != self._version:
+            self._load()
+
+    def _save(self, changed=(), added=()):
+        with self.db.transaction() as conn:
+            for appointment_id in added:
+                appointment = self._appointments[appointment_id]
+                conn.execute(
+                    "INSERT OR REPLACE INTO reminders (id, chat_id, at, label, sent) VALUES (?, ?, ?, ?, ?)",
+                    (appointment_id, appointment['chat_id'], appointment['at'], appointment['label'],
+                     json.dumps(appointment['sent'])))
+            for appointment_id in changed:
+                appointment = self._appointments.get(appointment_id)
+                if appointment is None:
+                    conn.execute("DELETE FROM reminders WHERE id = ?", (appointment_id,))
+                else:
+                    conn.execute(
+                        "UPDATE reminders SET sent = ? WHERE id = ? AND chat_id = ? AND at = ?",
+                        (json.dumps(appointment['sent']), appointment_id, appointment['chat_id'], appointment['at']))
+            version = _meta(conn, 'reminders_version')
+            _set_meta(conn, 'reminders_version', version + 1)
+        # Другой процесс успел что-то изменить — перечитаем при следующем обращении
+        if version == self._version:
+            self._version = version + 1
+
+    def import_once(self, load):
+        """Перенести записи из reminders.json, если это ещё не сделал другой процесс.
+
+        load() вызывается только при переносе; возвращает {id: запись}.
+        """
+        with self._lock:
+            with self.db.transaction() as conn:
+                if _meta(conn, 'reminders_imported'):
+                    return None
+                appointments = load()
+                for appointment_id, appointment in appointments.items():
+                    conn.execute(
+                        "INSERT OR IGNORE INTO reminders (id, chat_id, at, label, sent) VALUES (?, ?, ?, ?, ?)",
+                        (appointment_id, appointment['chat_id'], appointment['at'], appointment['label'],
+                         json.dumps(appointment['sent'])))
+                _set_meta(conn, 'reminders_imported', 1)
+                _set_meta(conn, 'reminders_version', _meta(conn, 'reminders_version') + 1)
+            self._load()
+            return len(appointments)
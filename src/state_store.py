@@ -0,0 +1,151 @@
+import time
+import atexit
+import pickle
+import threading
+from collections import OrderedDict
+
+from telebot.handler_backends import HandlerBackend
+
+from file_utils import atomic_write
+
+
+class StateStore:
+    """Ограниченное хранилище состояния диалогов.
+
+    Размер ограничен max_size (вытесняются давно не используемые записи),
+    у каждой записи есть срок жизни. При заданном snapshot_file содержимое
+    периодически сохраняется на диск и восстанавливается после перезапуска.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600, snapshot_file=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.snapshot_file = snapshot_file
+        self._lock = threading.RLock()
+        self._data = OrderedDict()   # ключ -> (время истечения, значение)
+        self._stop = threading.Event()
+
+        if snapshot_file:
+            self._restore()
+            atexit.register(self.snapshot)
+
+    def _expired(self, expires_at, now):
+        return expires_at is not None and expires_at <= now
+
+    def _purge(self, now):
+        # Сначала выбрасываем просроченные записи из начала, затем — лишние по размеру
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if not self._expired(expires_at, now):
+                break
+            del self._data[key]
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, ttl=None):
+        """Сохранить значение; ttl=None — срок по умолчанию"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            self._purge(now)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if self._expired(item[0], now):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def update(self, key, func, ttl=None):
+        """Атомарно заменить значение на func(текущее или None)"""
+        with self._lock:
+            value = func(self.get(key))
+            self.set(key, value, ttl)
+            return value
+
+    def pop(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None or self._expired(item[0], now):
+                return default
+            return item[1]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        with self._lock:
+            self._purge(time.time())
+            return len(self._data)
+
+    # ---------- снимки на диск ----------
+    def _restore(self):
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Не удалось восстановить состояние из {self.snapshot_file}: {e}")
+            return
+
+        now = time.time()
+        for key, (expires_at, value) in data.items():
+            if not self._expired(expires_at, now):
+                self._data[key] = (expires_at, value)
+        self._purge(now)
+        print(f"♻️ Восстановлено записей состояния: {len(self._data)} ({self.snapshot_file})")
+
+    def snapshot(self):
+        """Сохранить текущее состояние на диск"""
+        if not self.snapshot_file:
+            return
+        with self._lock:
+            self._purge(time.time())
+            data = dict(self._data)
+        with atomic_write(self.snapshot_file, 'wb') as f:
+            pickle.dump(data, f)
+
+    def start_snapshots(self, interval):
+        """Периодически сохранять снимок в фоновом потоке"""
+        if not self.snapshot_file or interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"❌ Ошибка сохранения состояния: {e}")
+
+        threading.Thread(target=loop, name='state-snapshot', daemon=True).start()
+
+
+class StateHandlerBackend(HandlerBackend):
+    """Хранение next-step обработчиков telebot в StateStore"""
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def register_handler(self, handler_group_id, handler):
+        # Чтение и запись — одна операция хранилища: в SqliteStateStore это
+        # одна транзакция, и обработчик из другого воркера не потеряется
+        self.store.update(handler_group_id, lambda handlers: (handlers or []) + [handler])
+
+    def clear_handlers(self, handler_group_id):
+        self.store.pop(handler_group_id)
+
+    def get_handlers(self, handler_group_id):
+        return self.store.pop(handler_group_id)
@@ -0,0 +1,128 @@
+import queue
+import threading
+from collections import deque, OrderedDict
+
+
+def chat_key(update):
+    """Ключ очереди: апдейты одного чата обрабатываются строго по порядку"""
+    for source in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if source is not None:
+            return source.chat.id
+    if update.callback_query is not None:
+        if update.callback_query.message is not None:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    # Прочие апдейты не привязаны к чату и могут идти параллельно
+    return ('update', update.update_id)
+
+
+class UpdateDispatcher:
+    """Ограниченная очередь апдейтов и пул потоков-обработчиков.
+
+    Апдейты разных чатов обрабатываются параллельно, одного чата — по очереди.
+    Повторные доставки с уже виденным update_id отбрасываются, а admit(update),
+    если задан, решает, пускать ли апдейт в очередь вообще. claims
+    (SqliteUpdateClaims) продлевает отсев дублей и порядок чата на все
+    процессы, которые делят базу.
+    """
+
+    def __init__(self, process, workers=4, queue_size=1000, dedup_size=10000, admit=None, claims=None):
+        self._process = process
+        self._admit = admit
+        self._claims = claims
+        self.workers = workers
+        self.queue_size = queue_size
+        self.dedup_size = dedup_size
+
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()   # ключи чатов, у которых есть работа
+        self._pending = {}            # ключ чата -> deque апдейтов
+        self._seen = OrderedDict()    # последние update_id для отсева дублей
+        self._size = 0
+        self._threads = []
+
+    def start(self):
+        """Запустить потоки-обработчики"""
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'update-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, update):
+        """Поставить апдейт в очередь. False — очередь переполнена"""
+        with self._lock:
+            if update.update_id in self._seen:
+                return True
+        key = chat_key(update)
+        if self._claims is not None and not self._claims.claim(update.update_id, key):
+            # Апдейт уже принят этим или другим воркером
+            return True
+        if self._admit is not None and not self._admit(update):
+            # Отброшен фильтром входящего потока; Telegram повторять не нужно
+            self._release(update)
+            return True
+
+        with self._lock:
+            if update.update_id in self._seen:
+                return True
+            full = self._size >= self.queue_size
+            if not full:
+                self._seen[update.update_id] = None
+                if len(self._seen) > self.dedup_size:
+                    self._seen.popitem(last=False)
+
+                updates = self._pending.get(key)
+                if updates is None:
+                    # Чат не в работе — ставим его в очередь готовых
+                    self._pending[key] = deque([update])
+                    self._ready.put(key)
+                else:
+                    updates.append(update)
+                self._size += 1
+        if full and self._claims is not None:
+            # Telegram доставит апдейт повторно — это не должно считаться дублем
+            self._claims.forget(update.update_id)
+        return not full
+
+    def _release(self, update):
+        if self._claims is None:
+            return
+        try:
+            self._claims.done(update.update_id)
+        except Exception as e:
+            # Заявка истечёт сама через lease
+            print(f"⚠️ Не удалось закрыть заявку апдейта {update.update_id}: {e}")
+
+    def depth(self):
+        """Сколько апдейтов ждёт или обрабатывается"""
+        return self._size
+
+    def _worker(self):
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                update = self._pending[key][0]
+
+            if self._claims is not None:
+                try:
+                    self._claims.wait_turn(update.update_id, key)
+                except Exception as e:
+                    print(f"⚠️ Апдейт {update.update_id} обрабатывается без очереди чата: {e}")
+            try:
+                self._process(update)
+            except Exception as e:
+                print(f"❌ Ошибка обработки апдейта {update.update_id}: {e}")
+            self._release(update)
+
+            with self._lock:
+                updates = self._pending[key]
+                updates.popleft()
+                self._size -= 1
+                if updates:
+                    # Следующий апдейт чата — в конец очереди, чтобы не задерживать другие чаты
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
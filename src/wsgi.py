@@ -0,0 +1,8 @@
+"""Точка входа для WSGI-сервера: gunicorn -c gunicorn.conf.py wsgi:app
+
+Каждый воркер импортирует бота, запускает фоновые службы и обслуживает
+тот же Flask app, что и python src/bot.py.
+"""
+from bot import app, prepare_wsgi_worker
+
+prepare_wsgi_worker()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бота лежат в src/ и импортируются по имени, как в src/bot.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
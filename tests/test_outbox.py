@@ -0,0 +1,98 @@
+import pytest
+
+from outbox import Outbox, OutboxError
+
+MENU = "Выберите действие"
+REPLY_KEYBOARD = '{"keyboard": [[{"text": "🏠"}]]}'
+INLINE_KEYBOARD = '{"inline_keyboard": [[{"text": "⭐"}]]}'
+
+
+class Response:
+    def __init__(self, status_code=200, text='{"ok": true}'):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeApi:
+    def __init__(self):
+        self.sent = []
+        self.fail = set()
+
+    def __call__(self, method, url, params=None, files=None, **kwargs):
+        self.sent.append((url.rsplit('/', 1)[-1], dict(params or {})))
+        if params and params.get('text') in self.fail:
+            return Response(400, '{"ok": false}')
+        return Response()
+
+
+def send_message(outbox, chat_id, text, reply_markup=None):
+    params = {'chat_id': chat_id, 'text': text}
+    if reply_markup is not None:
+        params['reply_markup'] = reply_markup
+    return outbox.request('post', 'https://api/bot/sendMessage', params)
+
+
+@pytest.fixture
+def api():
+    return FakeApi()
+
+
+@pytest.fixture
+def outbox(api):
+    return Outbox(api, filler_texts=(MENU,))
+
+
+def test_menu_prompt_gives_keyboard_to_previous_message(api, outbox):
+    with outbox.collect():
+        send_message(outbox, 1, "Готово")
+        send_message(outbox, 1, MENU, REPLY_KEYBOARD)
+    assert api.sent == [('sendMessage', {'chat_id': 1, 'text': "Готово", 'reply_markup': REPLY_KEYBOARD})]
+
+
+def test_unrelated_texts_are_not_glued(api, outbox):
+    with outbox.collect():
+        send_message(outbox, 1, "Первое")
+        send_message(outbox, 1, "Второе")
+    assert [params['text'] for _, params in api.sent] == ["Первое", "Второе"]
+
+
+def test_menu_prompt_for_another_chat_is_sent_as_is(api, outbox):
+    with outbox.collect():
+        send_message(outbox, 1, "Готово")
+        send_message(outbox, 2, MENU, REPLY_KEYBOARD)
+    assert [(params['chat_id'], params['text']) for _, params in api.sent] == [(1, "Готово"), (2, MENU)]
+
+
+def test_inline_keyboard_is_not_replaced_by_menu(api, outbox):
+    with outbox.collect():
+        send_message(outbox, 1, "Оценка", INLINE_KEYBOARD)
+        send_message(outbox, 1, MENU, REPLY_KEYBOARD)
+    assert [params['text'] for _, params in api.sent] == ["Оценка", MENU]
+
+
+def test_other_request_flushes_held_message_first(api, outbox):
+    with outbox.collect():
+        send_message(outbox, 1, "Текст")
+        outbox.request('post', 'https://api/bot/sendPhoto', {'chat_id': 1}, files={'photo': b''})
+    assert [method for method, _ in api.sent] == ['sendMessage', 'sendPhoto']
+
+
+def test_held_message_error_is_raised_on_exit(api, outbox):
+    api.fail.add("Сломано")
+    with pytest.raises(OutboxError):
+        with outbox.collect():
+            send_message(outbox, 1, "Сломано")
+
+
+def test_held_message_error_is_raised_from_next_request(api, outbox):
+    api.fail.add("Сломано")
+    with outbox.collect():
+        send_message(outbox, 1, "Сломано")
+        with pytest.raises(OutboxError):
+            send_message(outbox, 1, "Дальше")
+
+
+def test_requests_outside_collect_pass_through(api, outbox):
+    response = send_message(outbox, 1, "Рассылка")
+    assert response.status_code == 200
+    assert api.sent == [('sendMessage', {'chat_id': 1, 'text': "Рассылка"})]
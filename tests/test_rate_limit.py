@@ -0,0 +1,40 @@
+import pytest
+
+from rate_limit import TokenBucket
+
+
+def bucket(rate, capacity, now=100.0):
+    bucket = TokenBucket(rate, capacity)
+    bucket.updated = now
+    return bucket
+
+
+def test_reserve_allows_burst_then_waits():
+    tokens = bucket(rate=2, capacity=2)
+    assert tokens.reserve(100.0) == 0
+    assert tokens.reserve(100.0) == 0
+    assert tokens.reserve(100.0) == pytest.approx(0.5)
+    # Каждый следующий ждёт ещё один интервал 1/rate
+    assert tokens.reserve(100.0) == pytest.approx(1.0)
+
+
+def test_tokens_refill_up_to_capacity():
+    tokens = bucket(rate=1, capacity=3)
+    for _ in range(3):
+        tokens.reserve(100.0)
+    tokens.reserve(200.0)
+    assert tokens.tokens == pytest.approx(2)
+
+
+def test_try_take_does_not_go_into_debt():
+    tokens = bucket(rate=1, capacity=1)
+    assert tokens.try_take(100.0)
+    assert not tokens.try_take(100.5)
+    assert tokens.tokens == pytest.approx(0.5)
+    assert tokens.try_take(101.0)
+
+
+def test_reserve_respects_blocked_until():
+    tokens = bucket(rate=10, capacity=10)
+    tokens.blocked_until = 105.0
+    assert tokens.reserve(100.0) == pytest.approx(5.0)
@@ -0,0 +1,86 @@
+import json
+import time
+import threading
+
+from reminders import ReminderScheduler
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "не дождались"
+        time.sleep(0.01)
+
+
+class FlakySend:
+    """Первые failures вызовов падают, как при сбое сети"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_id, label, at, offset):
+        with self.lock:
+            self.calls.append((chat_id, label, offset))
+            if len(self.calls) <= self.failures:
+                raise ConnectionError("сеть недоступна")
+
+
+def scheduler(tmp_path, send, offsets, **kwargs):
+    kwargs.setdefault('poll_interval', 0.05)
+    return ReminderScheduler(send, str(tmp_path / 'reminders.json'), offsets, **kwargs)
+
+
+def test_failed_reminder_is_retried(tmp_path):
+    send = FlakySend(failures=1)
+    reminders = scheduler(tmp_path, send, [9.8], retry_delay=0.1)
+    reminders.add('visit', 5, time.time() + 10, 'Сб 17.10 в 12:00')
+    reminders.start()
+    try:
+        wait_for(lambda: len(send.calls) == 2)
+        wait_for(lambda: reminders.pending() == 0)
+    finally:
+        reminders.stop()
+    assert send.calls == [(5, 'Сб 17.10 в 12:00', 9.8)] * 2
+
+
+def test_sent_reminder_is_not_repeated_after_restart(tmp_path):
+    send = FlakySend()
+    reminders = scheduler(tmp_path, send, [9.8])
+    reminders.add('visit', 5, time.time() + 10, 'label')
+    reminders.start()
+    try:
+        wait_for(lambda: len(send.calls) == 1)
+    finally:
+        reminders.stop()
+
+    restarted = scheduler(tmp_path, send, [9.8])
+    assert restarted.get('visit')['sent'] == [9.8]
+    assert restarted.pending() == 0
+
+
+def test_only_closest_missed_reminder_is_sent(tmp_path):
+    # Бот был выключен: оба срока прошли, визит ещё впереди
+    appointment = {'chat_id': 5, 'at': time.time() + 1800, 'label': 'label', 'sent': []}
+    (tmp_path / 'reminders.json').write_text(json.dumps({'appointments': {'visit': appointment}}), encoding='utf-8')
+
+    send = FlakySend()
+    reminders = scheduler(tmp_path, send, [7200, 3600])
+    reminders.start()
+    try:
+        wait_for(lambda: len(send.calls) == 1)
+        time.sleep(0.1)
+    finally:
+        reminders.stop()
+    assert send.calls == [(5, 'label', 3600)]
+    assert reminders.pending() == 0
+
+
+def test_cancel_drops_pending_reminders(tmp_path):
+    reminders = scheduler(tmp_path, FlakySend(), [3600])
+    reminders.add('visit', 5, time.time() + 7200, 'label')
+    assert reminders.pending() == 1
+    assert reminders.cancel('visit')
+    assert not reminders.cancel('visit')
+    assert reminders.pending() == 0
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from review_search import ReviewIndex, parse_query, tokenize
+
+
+def review(text, rating=5, user_id=1, user_name='Анна', day=(2026, 9, 1)):
+    return {'text': text, 'rating': rating, 'user_id': user_id, 'user_name': user_name,
+            'timestamp': datetime(*day).timestamp()}
+
+
+def build(*reviews):
+    index = ReviewIndex()
+    for item in reviews:
+        index.add(item)
+    return index
+
+
+def test_tokenize_lowercases_and_folds_yo():
+    assert tokenize('Всё ОТЛИЧНО, ресницы!') == ['все', 'отлично', 'ресницы']
+
+
+def test_parse_query_ratings():
+    assert parse_query('оценка:5')['ratings'] == {5}
+    assert parse_query('оценка:4-5')['ratings'] == {4, 5}
+    assert parse_query('5⭐')['ratings'] == {5}
+
+
+def test_parse_query_reversed_range_is_the_same_range():
+    assert parse_query('оценка:5-1')['ratings'] == parse_query('оценка:1-5')['ratings'] == {1, 2, 3, 4, 5}
+
+
+def test_parse_query_dates_are_inclusive():
+    filters = parse_query('с:01.09.2026 по:30.09.2026')
+    assert filters['since'] == datetime(2026, 9, 1).timestamp()
+    assert filters['until'] == datetime(2026, 10, 1).timestamp()
+
+
+def test_parse_query_author_and_words():
+    filters = parse_query('@Анна Ресницы')
+    assert filters['author'] == 'Анна'
+    assert filters['words'] == ['ресницы']
+    assert parse_query('@12345')['author'] == 12345
+
+
+def test_search_matches_word_prefix():
+    index = build(review('Красивые ресницы'), review('Брови'))
+    assert index.search(words=['ресниц']) == [0]
+
+
+def test_search_combines_words_rating_and_author():
+    index = build(
+        review('ресницы супер', rating=5, user_name='Анна'),
+        review('ресницы так себе', rating=3, user_name='Анна'),
+        review('ресницы супер', rating=5, user_id=2, user_name='Мария'),
+    )
+    assert index.search(words=['ресницы'], ratings={5}) == [2, 0]
+    assert index.search(words=['ресницы'], author='мар') == [2]
+    assert index.search(author=1) == [1, 0]
+
+
+def test_search_by_time_range():
+    index = build(review('a', day=(2026, 8, 31)), review('b', day=(2026, 9, 15)), review('c', day=(2026, 10, 1)))
+    filters = parse_query('с:01.09.2026 по:30.09.2026')
+    assert index.search(since=filters['since'], until=filters['until']) == [1]
+
+
+def test_query_numbers_match_newest_first_listing():
+    index = build(review('a'), review('b'), review('c'))
+    total, page = index.query({'words': [], 'ratings': None, 'since': None, 'until': None, 'author': None}, 0, 2)
+    assert total == 3
+    assert [(number, item['text']) for number, item in page] == [(1, 'c'), (2, 'b')]
+
+
+def test_reset_empties_index():
+    index = build(review('a'))
+    index.reset()
+    assert len(index) == 0
+    assert index.search(words=['a']) == []
@@ -0,0 +1,76 @@
+import json
+
+from review_store import ReviewStore, CLEAR_MARKER
+
+
+def open_store(path):
+    # Фоновый fsync и сжатие в тестах не нужны: вызываем их явно
+    return ReviewStore(str(path), flush_interval=3600)
+
+
+def log_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_clear_marker_hides_earlier_reviews_after_restart(tmp_path):
+    log = tmp_path / 'reviews.jsonl'
+    store = open_store(log)
+    store.append({'rating': 5, 'text': 'старый'})
+    store.clear()
+    store.append({'rating': 4, 'text': 'новый'})
+    store.close()
+    assert CLEAR_MARKER in log_records(log)
+
+    store = open_store(log)
+    assert [review['text'] for review in store] == ['новый']
+    assert store.count(4) == 1
+    assert store.count(5) == 0
+    store.close()
+
+
+def test_compact_drops_cleared_reviews_and_marker(tmp_path):
+    log = tmp_path / 'reviews.jsonl'
+    store = open_store(log)
+    store.append({'rating': 5, 'text': 'a'})
+    store.clear()
+    store.append({'rating': 4, 'text': 'b'})
+    store.compact()
+    assert log_records(log) == [{'rating': 4, 'text': 'b'}]
+
+    # После подмены файла запись продолжается в новый журнал
+    store.append({'rating': 3, 'text': 'c'})
+    store.close()
+    assert log_records(log) == [{'rating': 4, 'text': 'b'}, {'rating': 3, 'text': 'c'}]
+
+
+def test_compact_without_garbage_keeps_file(tmp_path):
+    log = tmp_path / 'reviews.jsonl'
+    store = open_store(log)
+    store.append({'rating': 5, 'text': 'a'})
+    store.flush()
+    inode = log.stat().st_ino
+    store.compact()
+    assert log.stat().st_ino == inode
+    store.close()
+
+
+def test_truncated_last_line_is_dropped_on_open(tmp_path):
+    log = tmp_path / 'reviews.jsonl'
+    log.write_text('{"rating": 5, "text": "a"}\n{"rating": 4, "te', encoding='utf-8')
+    store = open_store(log)
+    assert len(store) == 1
+    store.append({'rating': 3, 'text': 'b'})
+    store.close()
+    assert log_records(log) == [{'rating': 5, 'text': 'a'}, {'rating': 3, 'text': 'b'}]
+
+
+def test_since_is_none_after_clear(tmp_path):
+    store = open_store(tmp_path / 'reviews.jsonl')
+    store.append({'rating': 5, 'text': 'a'})
+    checkpoint = store.checkpoint()
+    store.append({'rating': 4, 'text': 'b'})
+    assert store.since(checkpoint) == [{'rating': 4, 'text': 'b'}]
+    store.clear()
+    assert store.since(checkpoint) is None
+    store.close()
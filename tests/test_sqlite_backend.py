@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from sqlite_backend import (
+    Database, SqliteReviewStore, SqliteStateStore, SqliteSlotStore,
+    SqliteSubscriberRegistry, SqliteReminderScheduler
+)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'bot.db')
+
+
+def loader(result):
+    """load() для import_once, который запоминает, что его вызвали"""
+    def load():
+        load.calls += 1
+        return result
+    load.calls = 0
+    return load
+
+
+def test_reviews_import_once(db_path):
+    store = SqliteReviewStore(Database(db_path))
+    load = loader([{'rating': 5, 'text': 'a'}, {'rating': 4, 'text': 'b'}])
+    assert store.import_once(load) == 2
+    assert [review['text'] for review in store] == ['a', 'b']
+
+    # Второй процесс со своим соединением переносить уже не должен
+    other = SqliteReviewStore(Database(db_path))
+    again = loader([{'rating': 1, 'text': 'c'}])
+    assert other.import_once(again) is None
+    assert again.calls == 0
+    assert len(other) == 2
+
+
+def test_reviews_import_once_survives_later_clear(db_path):
+    store = SqliteReviewStore(Database(db_path))
+    store.import_once(loader([{'rating': 5, 'text': 'a'}]))
+    store.clear()
+    assert store.import_once(loader([{'rating': 5, 'text': 'a'}])) is None
+    assert len(store) == 0
+
+
+def test_slots_import_once(db_path):
+    store = SqliteSlotStore(Database(db_path))
+    slot = {'date': '2026-10-20', 'time': '12:00', 'duration': 60, 'booked': False}
+    assert store.import_once(loader([slot])) == 1
+    assert store.day(date(2026, 10, 20)) == [slot]
+    assert SqliteSlotStore(Database(db_path)).import_once(loader([slot])) is None
+
+
+def test_subscribers_import_once_per_list(db_path):
+    database = Database(db_path)
+    subscribers = SqliteSubscriberRegistry(database, 'subscribers')
+    assert subscribers.import_once(loader([1, 2])) == 2
+    assert subscribers.import_once(loader([3])) is None
+    assert sorted(subscribers.chat_ids()) == [1, 2]
+
+    # У другого списка своя отметка о переносе
+    other = SqliteSubscriberRegistry(database, 'other')
+    assert other.import_once(loader([3])) == 1
+    assert 3 in other and 3 not in subscribers
+
+
+def test_reminders_import_once(db_path):
+    appointment = {'chat_id': 5, 'at': 1900000000.0, 'label': 'label', 'sent': [86400.0]}
+    reminders = SqliteReminderScheduler(Database(db_path), lambda *args: None, [86400.0, 7200.0])
+    assert reminders.import_once(loader({'visit': appointment})) == 1
+    assert reminders.get('visit') == appointment
+
+    other = SqliteReminderScheduler(Database(db_path), lambda *args: None, [86400.0, 7200.0])
+    assert other.import_once(loader({'other': appointment})) is None
+    assert other.appointments() == {'visit': appointment}
+
+
+def test_state_update_is_read_modify_write(db_path):
+    state = SqliteStateStore(Database(db_path), 'next_steps')
+    state.update(1, lambda handlers: (handlers or []) + ['a'])
+    SqliteStateStore(Database(db_path), 'next_steps').update(1, lambda handlers: (handlers or []) + ['b'])
+    assert state.get(1) == ['a', 'b']
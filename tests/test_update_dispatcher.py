@@ -0,0 +1,137 @@
+import time
+import threading
+from types import SimpleNamespace
+
+from update_dispatcher import UpdateDispatcher, chat_key
+from sqlite_backend import Database, SqliteUpdateClaims
+
+
+def message_update(update_id, chat_id):
+    return SimpleNamespace(
+        update_id=update_id,
+        message=SimpleNamespace(chat=SimpleNamespace(id=chat_id)),
+        edited_message=None, channel_post=None, edited_channel_post=None, callback_query=None)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "не дождались"
+        time.sleep(0.005)
+
+
+class Recorder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.done = []
+        self.active = set()
+        self.max_parallel = 0
+
+    def __call__(self, update):
+        with self.lock:
+            self.active.add(update.update_id)
+            self.max_parallel = max(self.max_parallel, len(self.active))
+        time.sleep(self.delay)
+        with self.lock:
+            self.active.discard(update.update_id)
+            self.done.append((update.message.chat.id, update.update_id))
+
+
+def test_chat_key_uses_callback_message_chat():
+    update = SimpleNamespace(
+        update_id=1, message=None, edited_message=None, channel_post=None, edited_channel_post=None,
+        callback_query=SimpleNamespace(message=SimpleNamespace(chat=SimpleNamespace(id=7)),
+                                       from_user=SimpleNamespace(id=9)))
+    assert chat_key(update) == 7
+
+
+def test_updates_of_one_chat_keep_order_while_chats_run_in_parallel():
+    recorder = Recorder(delay=0.01)
+    dispatcher = UpdateDispatcher(recorder, workers=4)
+    dispatcher.start()
+    for update_id in range(1, 21):
+        assert dispatcher.submit(message_update(update_id, chat_id=update_id % 2))
+    wait_for(lambda: len(recorder.done) == 20)
+
+    for chat_id in (0, 1):
+        ids = [update_id for chat, update_id in recorder.done if chat == chat_id]
+        assert ids == sorted(ids)
+    assert recorder.max_parallel == 2
+
+
+def test_duplicate_update_id_is_processed_once():
+    recorder = Recorder()
+    dispatcher = UpdateDispatcher(recorder, workers=2)
+    dispatcher.start()
+    assert dispatcher.submit(message_update(1, 5))
+    assert dispatcher.submit(message_update(1, 5))
+    wait_for(lambda: dispatcher.depth() == 0)
+    assert recorder.done == [(5, 1)]
+
+
+def test_full_queue_rejects_update_for_redelivery():
+    dispatcher = UpdateDispatcher(Recorder(), queue_size=1)
+    assert dispatcher.submit(message_update(1, 5))
+    assert not dispatcher.submit(message_update(2, 6))
+    # Отклонённый апдейт не запомнен как увиденный
+    assert 2 not in dispatcher._seen
+
+
+def test_admit_filter_drops_update():
+    recorder = Recorder()
+    dispatcher = UpdateDispatcher(recorder, admit=lambda update: update.update_id != 2)
+    dispatcher.start()
+    for update_id in (1, 2, 3):
+        assert dispatcher.submit(message_update(update_id, 5))
+    wait_for(lambda: len(recorder.done) == 2)
+    assert recorder.done == [(5, 1), (5, 3)]
+
+
+def test_claims_dedup_across_dispatchers(tmp_path):
+    database = Database(str(tmp_path / 'bot.db'))
+    first, second = Recorder(), Recorder()
+    dispatchers = [UpdateDispatcher(first, claims=SqliteUpdateClaims(database)),
+                   UpdateDispatcher(second, claims=SqliteUpdateClaims(database))]
+    for dispatcher in dispatchers:
+        dispatcher.start()
+        assert dispatcher.submit(message_update(1, 5))
+    wait_for(lambda: len(first.done) + len(second.done) == 1)
+    time.sleep(0.05)
+    assert first.done + second.done == [(5, 1)]
+
+
+def test_claims_wait_for_earlier_update_of_another_process(tmp_path):
+    database = Database(str(tmp_path / 'bot.db'))
+    claims = SqliteUpdateClaims(database, lease=5.0, poll_interval=0.005)
+    assert claims.claim(1, 5)
+    # Апдейт 1 как будто обрабатывает другой воркер
+    database.execute("UPDATE updates SET owner = -1 WHERE update_id = 1")
+
+    recorder = Recorder()
+    dispatcher = UpdateDispatcher(recorder, claims=claims)
+    dispatcher.start()
+    assert dispatcher.submit(message_update(2, 5))
+    time.sleep(0.1)
+    assert recorder.done == []
+
+    claims.done(1)
+    wait_for(lambda: recorder.done == [(5, 2)])
+
+
+def test_claims_expired_lease_does_not_block_chat(tmp_path):
+    database = Database(str(tmp_path / 'bot.db'))
+    claims = SqliteUpdateClaims(database, lease=0.1, poll_interval=0.005)
+    claims.claim(1, 5)
+    database.execute("UPDATE updates SET owner = -1 WHERE update_id = 1")
+    start = time.monotonic()
+    claims.wait_turn(2, 5)
+    assert time.monotonic() - start < 1.0
+
+
+def test_claims_forget_allows_redelivery(tmp_path):
+    claims = SqliteUpdateClaims(Database(str(tmp_path / 'bot.db')))
+    assert claims.claim(1, 5)
+    assert not claims.claim(1, 5)
+    claims.forget(1)
+    assert claims.claim(1, 5)